@@ -1,15 +1,16 @@
-from flask import Blueprint, request, jsonify, session
-from werkzeug.security import check_password_hash, generate_password_hash
-from src.models.user import db, User
+from flask import Blueprint, request, jsonify, session, current_app
+from src.routes.auth_middleware import issue_token, decode_token, verify_token_decorator
+from src.routes.passwords import PASSWORD_HASHER, PasswordHasherBusy
+from src.routes.user_directory import USER_DIRECTORY, normalize_email
 import jwt
-import datetime
 
 auth_bp = Blueprint('auth', __name__)
 
-# Dados de teste para demonstração
-TEST_USERS = {
+# Alunos de demonstração, cadastrados no banco na criação do schema
+SEED_USERS = {
     'teste@astecaseguranca.com.br': {
-        'password': 'asteca2025',
+        # Senha de demonstração: asteca2025
+        'password_hash': 'pbkdf2:sha256:600000$VmJf4k8eg9fAWnqS$998d3a78ad427dfd3374656c622d540338465d297c2ad4668cbdbade55713724',
         'name': 'Aluno Teste',
         'team': 'Pintores Pro',
         'level': 3,
@@ -19,6 +20,16 @@ TEST_USERS = {
     }
 }
 
+# Hash usado quando o email não existe, para que a resposta leve o mesmo
+# tempo e não revele quais emails estão cadastrados
+DUMMY_PASSWORD_HASH = SEED_USERS['teste@astecaseguranca.com.br']['password_hash']
+
+def public_user_data(user):
+    """Dados do usuário sem o hash da senha"""
+    user_data = dict(user)
+    del user_data['password_hash']
+    return user_data
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """Endpoint para login de usuários"""
@@ -27,28 +38,41 @@ def login():
     if not data or 'email' not in data or 'password' not in data:
         return jsonify({'error': 'Email e senha são obrigatórios'}), 400
     
-    email = data['email'].lower().strip()
+    if not isinstance(data['email'], str) or not isinstance(data['password'], str):
+        return jsonify({'error': 'Email e senha devem ser texto'}), 400
+    
+    email = normalize_email(data['email'])
     password = data['password']
     
-    # Verificar usuário de teste
-    if email in TEST_USERS:
-        if TEST_USERS[email]['password'] == password:
-            # Criar token JWT
-            token = jwt.encode({
-                'email': email,
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-            }, 'secret_key', algorithm='HS256')
+    user = USER_DIRECTORY.get(email)
+    password_hash = user['password_hash'] if user else DUMMY_PASSWORD_HASH
+    
+    # Verificação do hash no pool de hashing, fora da thread da requisição
+    try:
+        password_ok = PASSWORD_HASHER.verify(password_hash, password)
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Muitos acessos no momento, tente novamente em instantes'}), 503
+    
+    if user and password_ok:
+        # Hash com parâmetros antigos é refeito em segundo plano
+        if PASSWORD_HASHER.needs_rehash(user['password_hash']):
+            app = current_app._get_current_object()
             
-            user_data = TEST_USERS[email].copy()
-            user_data['email'] = email
-            del user_data['password']
+            def save_hash(new_hash):
+                with app.app_context():
+                    USER_DIRECTORY.update(email, password_hash=new_hash)
             
-            return jsonify({
-                'success': True,
-                'token': token,
-                'user': user_data,
-                'message': 'Login realizado com sucesso!'
-            }), 200
+            PASSWORD_HASHER.rehash_later(password, save_hash)
+        
+        # Criar token JWT
+        token = issue_token(email)
+        
+        return jsonify({
+            'success': True,
+            'token': token,
+            'user': public_user_data(user),
+            'message': 'Login realizado com sucesso!'
+        }), 200
     
     return jsonify({'error': 'Email ou senha incorretos'}), 401
 
@@ -61,17 +85,13 @@ def verify_token():
         return jsonify({'error': 'Token é obrigatório'}), 400
     
     try:
-        payload = jwt.decode(data['token'], 'secret_key', algorithms=['HS256'])
-        email = payload['email']
+        payload = decode_token(data['token'])
+        user = USER_DIRECTORY.get(payload['email'])
         
-        if email in TEST_USERS:
-            user_data = TEST_USERS[email].copy()
-            user_data['email'] = email
-            del user_data['password']
-            
+        if user:
             return jsonify({
                 'valid': True,
-                'user': user_data
+                'user': public_user_data(user)
             }), 200
     except jwt.ExpiredSignatureError:
         return jsonify({'error': 'Token expirado'}), 401
@@ -86,53 +106,56 @@ def logout():
     return jsonify({'success': True, 'message': 'Logout realizado com sucesso'}), 200
 
 @auth_bp.route('/profile', methods=['GET'])
+@verify_token_decorator
 def get_profile():
     """Obter perfil do usuário logado"""
-    auth_header = request.headers.get('Authorization')
+    user = USER_DIRECTORY.get(request.user_email)
     
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({'error': 'Token de autorização necessário'}), 401
-    
-    token = auth_header.split(' ')[1]
-    
-    try:
-        payload = jwt.decode(token, 'secret_key', algorithms=['HS256'])
-        email = payload['email']
-        
-        if email in TEST_USERS:
-            user_data = TEST_USERS[email].copy()
-            user_data['email'] = email
-            del user_data['password']
-            
-            return jsonify({
-                'success': True,
-                'user': user_data
-            }), 200
-    except jwt.ExpiredSignatureError:
-        return jsonify({'error': 'Token expirado'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'error': 'Token inválido'}), 401
+    if user:
+        return jsonify({
+            'success': True,
+            'user': public_user_data(user)
+        }), 200
     
     return jsonify({'error': 'Usuário não encontrado'}), 404
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
-    """Endpoint para registro de novos usuários (demo)"""
+    """Endpoint para registro de novos usuários"""
     data = request.get_json()
     
     required_fields = ['email', 'password', 'name']
     for field in required_fields:
         if not data or field not in data:
             return jsonify({'error': f'{field} é obrigatório'}), 400
+        if not isinstance(data[field], str) or not data[field].strip():
+            return jsonify({'error': f'{field} deve ser um texto não vazio'}), 400
+    
+    team = data.get('team') or ''
+    if not isinstance(team, str):
+        return jsonify({'error': 'team deve ser texto'}), 400
+    # Equipes são cadastradas pela administração; o aluno só escolhe uma existente
+    if team and not USER_DIRECTORY.team_exists(team):
+        return jsonify({'error': 'Equipe não encontrada'}), 400
+    
+    email = normalize_email(data['email'])
     
-    email = data['email'].lower().strip()
+    if email in USER_DIRECTORY:
+        return jsonify({'error': 'Email já cadastrado'}), 409
+    
+    try:
+        password_hash = PASSWORD_HASHER.hash(data['password'])
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Muitos acessos no momento, tente novamente em instantes'}), 503
     
-    if email in TEST_USERS:
+    # None se outro pedido registrou o mesmo email enquanto o hash era gerado
+    user = USER_DIRECTORY.add(email, password_hash, data['name'].strip(), team)
+    if user is None:
         return jsonify({'error': 'Email já cadastrado'}), 409
     
-    # Simular registro (em produção, salvaria no banco de dados)
     return jsonify({
         'success': True,
-        'message': 'Para se registrar, entre em contato com a Vanessa pelo WhatsApp: (47) 99695-0869'
-    }), 200
+        'message': 'Cadastro realizado com sucesso!',
+        'user': public_user_data(user)
+    }), 201
 
@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify, current_app
+import hashlib
+import threading
+import time
+import jwt
+import datetime
+
+JWT_SECRET = 'secret_key'
+JWT_ALGORITHM = 'HS256'
+TOKEN_LIFETIME = datetime.timedelta(hours=24)
+
+
+class TokenCache:
+    """Cache LRU de tokens já verificados, indexado pelo digest do token
+
+    Cada entrada expira junto com o claim exp do token, então um token
+    expirado nunca é aceito a partir do cache.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        """Payload em cache do token, ou None"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token, payload):
+        """Guardar payload verificado até o exp do token"""
+        expires_at = payload.get('exp')
+        if expires_at is None:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+TOKEN_CACHE = TokenCache()
+
+
+def issue_token(email):
+    """Criar token JWT para o usuário"""
+    return jwt.encode({
+        'email': email,
+        'exp': datetime.datetime.utcnow() + TOKEN_LIFETIME
+    }, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def decode_token(token):
+    """Verificar token JWT, usando o cache de tokens já verificados
+
+    Levanta jwt.ExpiredSignatureError ou jwt.InvalidTokenError como jwt.decode.
+    """
+    payload = TOKEN_CACHE.get(token)
+    if payload is None:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        TOKEN_CACHE.put(token, payload)
+    return payload
+
+
+def bearer_token():
+    """Token do cabeçalho Authorization, ou None"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ')[1]
+
+
+def verify_token_decorator(f):
+    """Decorator para verificar token JWT"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = bearer_token()
+
+        if not token:
+            return jsonify({'error': 'Token de autorização necessário'}), 401
+
+        try:
+            payload = decode_token(token)
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token expirado'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Token inválido'}), 401
+
+        request.user_email = payload['email']
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def admin_required(f):
+    """Decorator para rotas administrativas: token válido de um email em ADMIN_EMAILS"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        admins = {email.strip().casefold() for email in current_app.config.get('ADMIN_EMAILS', ())}
+        if request.user_email.strip().casefold() not in admins:
+            return jsonify({'error': 'Acesso restrito a administradores'}), 403
+        return f(*args, **kwargs)
+
+    return verify_token_decorator(decorated_function)
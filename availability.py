@@ -0,0 +1,144 @@
+import datetime
+
+
+class SlotCalendar:
+    """Bitmaps de ocupação sobre os modelos de horários (dias úteis / sábado)
+
+    Cada horário do modelo corresponde a um bit, na ordem da lista de horários;
+    um bit ligado em free_mask indica horário livre.
+    """
+
+    def __init__(self, templates):
+        self.templates = {key: list(times) for key, times in templates.items()}
+        self._bits = {
+            key: {time: 1 << index for index, time in enumerate(times)}
+            for key, times in self.templates.items()
+        }
+        self._full_masks = {key: (1 << len(times)) - 1 for key, times in self.templates.items()}
+
+    @staticmethod
+    def template_for(day):
+        """Modelo de horários do dia, ou None aos domingos"""
+        weekday = day.weekday()  # 0 = Monday, 6 = Sunday
+        if weekday < 5:
+            return 'weekdays'
+        if weekday == 5:
+            return 'saturday'
+        return None
+
+    def times_for(self, day):
+        """Horários do modelo para o dia (lista vazia aos domingos)"""
+        template = self.template_for(day)
+        return self.templates[template] if template else []
+
+    def free_mask(self, template, taken_times):
+        """Bitmap dos horários livres dado o conjunto de horários ocupados"""
+        bits = self._bits[template]
+        occupied = 0
+        for time in taken_times:
+            occupied |= bits.get(time, 0)
+        return self._full_masks[template] & ~occupied
+
+    def times_from_mask(self, template, mask):
+        """Converter bitmap em lista de horários"""
+        return [time for time, bit in self._bits[template].items() if mask & bit]
+
+    def range_availability(self, start, end, taken_by_date):
+        """Disponibilidade por dia entre start e end (inclusive), sem domingos
+
+        taken_by_date mapeia 'YYYY-MM-DD' -> horários ocupados, obtido com uma
+        única consulta para todo o intervalo.
+        """
+        day = start
+        one_day = datetime.timedelta(days=1)
+        while day <= end:
+            template = self.template_for(day)
+            if template:
+                date_str = day.isoformat()
+                yield date_str, template, self.free_mask(template, taken_by_date.get(date_str, ()))
+            day += one_day
+
+    def preference_masks(self, time_from=None, time_to=None):
+        """Bitmap por modelo dos horários na faixa [time_from, time_to) ('HH:MM')"""
+        return {
+            template: sum(
+                bit for time, bit in bits.items()
+                if (time_from is None or time >= time_from) and (time_to is None or time < time_to)
+            )
+            for template, bits in self._bits.items()
+        }
+
+    def free_slots(self, start, end, taken_by_date, weekdays=None, masks=None):
+        """Horários livres (data, hora) entre start e end, em ordem
+
+        weekdays restringe os dias da semana (0 = segunda) e masks os
+        horários por modelo (ver preference_masks). Todos os dias do
+        intervalo são visitados (custo linear no número de dias), mas cada
+        um custa uma operação de bits: dias lotados ou fora da preferência
+        têm máscara zero e são descartados sem olhar os horários; dentro do
+        dia, o bit livre mais baixo é extraído com mask & -mask.
+        """
+        for date_str, template, free_mask in self.range_availability(start, end, taken_by_date):
+            if masks is not None:
+                free_mask &= masks[template]
+            if not free_mask or (weekdays is not None and datetime.date.fromisoformat(date_str).weekday() not in weekdays):
+                continue
+            times = self.templates[template]
+            while free_mask:
+                bit = free_mask & -free_mask
+                yield date_str, times[bit.bit_length() - 1]
+                free_mask ^= bit
+
+    def allocate(self, start, end, taken_by_date, count, seats=None):
+        """Os count primeiros lugares livres entre start e end, em ordem
+
+        seats(data, hora) dá quantos lugares restam no horário (padrão: 1);
+        um horário aparece uma vez por lugar atribuído. O custo é
+        proporcional aos dias percorridos e aos lugares atribuídos, não ao
+        tamanho dos modelos. Retorna menos de count se o intervalo não
+        comportar todos.
+        """
+        slots = []
+        for date_str, time in self.free_slots(start, end, taken_by_date):
+            free = seats(date_str, time) if seats else 1
+            slots.extend([(date_str, time)] * min(free, count - len(slots)))
+            if len(slots) == count:
+                break
+        return slots
+
+
+class SlotCapacity:
+    """Lugares por horário: uma prova por examinador/sala e limites por curso
+
+    A ocupação de um horário é um contador por curso ({curso: n}, ver
+    ExamStore.usage_between); os lugares restantes saem desses contadores
+    sem percorrer os agendamentos.
+    """
+
+    def __init__(self, rooms, course_limits=None):
+        self.rooms = list(rooms)
+        self.seats = len(self.rooms)
+        self.course_limits = dict(course_limits or {})
+
+    def room(self, seat):
+        """Nome da sala do lugar seat (None se a sala saiu da configuração)"""
+        return self.rooms[seat] if 0 <= seat < self.seats else None
+
+    def course_limit(self, course_id):
+        """Provas simultâneas permitidas para o curso (no máximo uma por sala)"""
+        return min(self.course_limits.get(course_id, self.seats), self.seats)
+
+    def remaining(self, counts, course_id=None):
+        """Lugares restantes no horário, para qualquer curso ou para course_id"""
+        free = self.seats - sum(counts.values())
+        if course_id is not None:
+            free = min(free, self.course_limit(course_id) - counts.get(course_id, 0))
+        return max(free, 0)
+
+    def full_times(self, usage, course_id=None):
+        """Horários sem lugar restante em {hora: {curso: n}}"""
+        return {time for time, counts in usage.items() if not self.remaining(counts, course_id)}
+
+    def full_times_by_date(self, usage_by_date, course_id=None):
+        """Horários lotados por data, no formato taken_by_date do SlotCalendar"""
+        return {date: self.full_times(usage, course_id) for date, usage in usage_by_date.items()}
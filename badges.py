@@ -0,0 +1,70 @@
+import bisect
+
+
+class BadgeEngine:
+    """Concessão incremental de badges por limiares de pontos e de cursos
+
+    Os limiares ficam ordenados; a cada evento só são avaliadas as regras
+    cujo limiar foi cruzado entre o estado anterior e o novo (via bisect).
+    Uma badge com os dois requisitos é avaliada quando qualquer um deles é
+    cruzado e concedida quando ambos forem atendidos. As badges conquistadas
+    ficam só no perfil do aluno (user_accounts); o engine não guarda estado
+    por usuário.
+    """
+
+    def __init__(self, badges, total_courses):
+        self._badges = badges
+        self.set_total_courses(total_courses)
+
+    def set_total_courses(self, total_courses):
+        """Remontar os limiares (ex.: 'all' após mudança no catálogo)"""
+        requirements = {}
+        for badge_id, badge in self._badges.items():
+            courses_required = badge.get('courses_required')
+            if courses_required == 'all':
+                courses_required = total_courses
+            requirements[badge_id] = (badge.get('points_required', 0), courses_required or 0)
+
+        self._requirements = requirements
+        self._points_thresholds = self._thresholds(
+            (points, badge_id) for badge_id, (points, _) in requirements.items()
+        )
+        self._course_thresholds = self._thresholds(
+            (courses, badge_id) for badge_id, (_, courses) in requirements.items() if courses
+        )
+
+    def available(self, awarded):
+        """Ids das badges ainda não conquistadas, na ordem de cadastro"""
+        return [badge_id for badge_id in self._badges if badge_id not in awarded]
+
+    def evaluate(self, awarded, before, after):
+        """Badges cruzadas entre before e after: (pontos, cursos concluídos)
+
+        Retorna os ids das badges ainda fora de awarded concedidas neste evento.
+        """
+        candidates = set(self._crossed(self._points_thresholds, before[0], after[0]))
+        candidates.update(self._crossed(self._course_thresholds, before[1], after[1]))
+        return [
+            badge_id for badge_id in self._badges
+            if badge_id in candidates and badge_id not in awarded and self._satisfied(badge_id, after)
+        ]
+
+    def _satisfied(self, badge_id, state):
+        points_required, courses_required = self._requirements[badge_id]
+        return state[0] >= points_required and state[1] >= courses_required
+
+    @staticmethod
+    def _thresholds(rules):
+        """(limiares ordenados, ids das badges na mesma ordem)"""
+        rules = sorted(rules)
+        return [value for value, _ in rules], [badge_id for _, badge_id in rules]
+
+    @staticmethod
+    def _crossed(thresholds, old_value, new_value):
+        """Badges com limiar em (old_value, new_value]"""
+        if new_value <= old_value:
+            return []
+        values, badge_ids = thresholds
+        start = bisect.bisect_right(values, old_value)
+        stop = bisect.bisect_right(values, new_value)
+        return badge_ids[start:stop]
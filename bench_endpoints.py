@@ -0,0 +1,245 @@
+"""Benchmark das rotas /api: requisições por segundo e latência p50/p95/p99
+
+Uso:
+    python bench_endpoints.py                       # Flask test client, banco temporário
+    python bench_endpoints.py --url http://localhost:5000
+    python bench_endpoints.py --concurrency 8 --requests 400 --save-baseline baseline.json
+    python bench_endpoints.py --baseline baseline.json --threshold 0.2
+
+Com --baseline, termina com código 1 se alguma rota ficar mais lenta (p95)
+ou com menos vazão (req/s) que a linha de base além do limite.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+LOGIN = {'email': 'teste@astecaseguranca.com.br', 'password': 'asteca2025'}
+WEEKDAY_TIMES = ['08:00', '09:00', '10:00', '14:00', '15:00', '16:00', '17:00']
+SATURDAY_TIMES = ['08:00', '09:00', '10:00', '11:00']
+
+
+class TestClient:
+    """Requisições pelo Flask test client (um client por thread)"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, json_body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=json_body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Requisições HTTP contra um servidor já em execução"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, json_body=None, headers=None):
+        data = json.dumps(json_body).encode('utf-8') if json_body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            request.add_header(name, value)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as error:
+            status, body = error.code, error.read()
+        try:
+            return status, json.loads(body) if body else None
+        except ValueError:
+            return status, None
+
+
+class SlotAllocator:
+    """Horários únicos bem no futuro, para que agendamentos não conflitem"""
+
+    def __init__(self, start):
+        self._slots = self._generate(start)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _generate(day):
+        while True:
+            times = WEEKDAY_TIMES if day.weekday() < 5 else SATURDAY_TIMES if day.weekday() == 5 else []
+            for time_slot in times:
+                yield day.isoformat(), time_slot
+            day += datetime.timedelta(days=1)
+
+    def next(self):
+        with self._lock:
+            return next(self._slots)
+
+
+def build_routes(client, token, slots):
+    """Cenários de benchmark: nome -> função que executa e retorna [(rota, segundos, status)]"""
+    auth = {'Authorization': f'Bearer {token}'}
+    query_date = (datetime.date.today() + datetime.timedelta(days=7)).isoformat()
+
+    def timed(name, method, path, json_body=None, headers=None):
+        started = time.perf_counter()
+        status, body = client.request(method, path, json_body, headers)
+        return (name, time.perf_counter() - started, status), body
+
+    def simple(name, method, path, json_body=None, headers=None):
+        return lambda: [timed(name, method, path, json_body, headers)[0]]
+
+    def exam_lifecycle():
+        date, time_slot = slots.next()
+        results = []
+        result, body = timed('schedule-exam', 'POST', '/api/scheduling/schedule-exam',
+                             {'course_id': 'nr35', 'date': date, 'time': time_slot}, auth)
+        results.append(result)
+        if result[2] != 201:
+            return results
+        exam_id = body['exam']['id']
+        date, time_slot = slots.next()
+        results.append(timed('reschedule-exam', 'PUT', f'/api/scheduling/reschedule-exam/{exam_id}',
+                             {'date': date, 'time': time_slot}, auth)[0])
+        results.append(timed('cancel-exam', 'DELETE', f'/api/scheduling/cancel-exam/{exam_id}',
+                             None, auth)[0])
+        return results
+
+    return {
+        'login': simple('login', 'POST', '/api/auth/login', LOGIN),
+        'verify-token': simple('verify-token', 'POST', '/api/auth/verify-token', {'token': token}),
+        'profile': simple('profile', 'GET', '/api/auth/profile', headers=auth),
+        'courses': simple('courses', 'GET', '/api/courses/courses'),
+        'course-details': simple('course-details', 'GET', '/api/courses/courses/nr35'),
+        'course-search': simple('course-search', 'GET', '/api/courses/search?q=seguranca'),
+        'ranking-teams': simple('ranking-teams', 'GET', '/api/courses/ranking/teams'),
+        'ranking-individual': simple('ranking-individual', 'GET', '/api/courses/ranking/individual'),
+        'badges': simple('badges', 'GET', '/api/courses/badges'),
+        'user-progress': simple('user-progress', 'GET', '/api/courses/user-progress', headers=auth),
+        'available-times': simple('available-times', 'GET', f'/api/scheduling/available-times?date={query_date}'),
+        'next-available': simple('next-available', 'GET', f'/api/scheduling/available-times/next?date={query_date}'),
+        'my-exams': simple('my-exams', 'GET', '/api/scheduling/my-exams', headers=auth),
+        'exam-lifecycle': exam_lifecycle,
+    }
+
+
+def percentile(sorted_values, fraction):
+    """Percentil pelo método nearest-rank"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(scenario, total, concurrency):
+    """Executar o cenário total vezes com a concorrência dada"""
+    samples = {}
+    errors = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for results in executor.map(lambda _: scenario(), range(total)):
+            for name, seconds, status in results:
+                samples.setdefault(name, []).append(seconds)
+                if status >= 400:
+                    errors[name] = errors.get(name, 0) + 1
+    elapsed = time.perf_counter() - started
+
+    stats = {}
+    for name, values in samples.items():
+        values.sort()
+        stats[name] = {
+            'requests': len(values),
+            'errors': errors.get(name, 0),
+            'rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2)
+        }
+    return stats
+
+
+def compare(results, baseline, threshold):
+    """Rotas que regrediram em relação à linha de base"""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if stats['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']} ms -> {stats['p95_ms']} ms")
+        if stats['rps'] < base['rps'] * (1 - threshold):
+            regressions.append(f"{name}: req/s {base['rps']} -> {stats['rps']}")
+    return regressions
+
+
+def make_client(url):
+    if url:
+        return HttpClient(url)
+    from main import create_app
+    database_dir = tempfile.mkdtemp(prefix='asteca-bench-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(database_dir, 'bench.db')}",
+        'CREATE_SCHEMA': 'startup'
+    })
+    return TestClient(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='URL base de um servidor em execução (padrão: Flask test client)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='execuções por rota')
+    parser.add_argument('--routes', help='lista de rotas separadas por vírgula (padrão: todas)')
+    parser.add_argument('--save-baseline', metavar='ARQUIVO')
+    parser.add_argument('--baseline', metavar='ARQUIVO')
+    parser.add_argument('--threshold', type=float, default=0.2, help='regressão tolerada (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    client = make_client(args.url)
+    status, body = client.request('POST', '/api/auth/login', LOGIN)
+    if status != 200:
+        sys.exit(f'Falha no login ({status}): {body}')
+
+    # Começa em uma data diferente a cada execução para não colidir com
+    # agendamentos de execuções anteriores contra o mesmo servidor
+    slots = SlotAllocator(datetime.date.today() + datetime.timedelta(days=400 + int(time.time()) % 1000))
+    routes = build_routes(client, body['token'], slots)
+    selected = args.routes.split(',') if args.routes else list(routes)
+
+    results = {}
+    for name in selected:
+        results.update(run_scenario(routes[name], args.requests, args.concurrency))
+
+    print(f"{'rota':<20} {'req':>6} {'erros':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in results.items():
+        print(f"{name:<20} {stats['requests']:>6} {stats['errors']:>6} {stats['rps']:>9} "
+              f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f'Linha de base salva em {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print('Regressões acima do limite:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print('Nenhuma regressão acima do limite')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark de hashing de senhas: logins por segundo por núcleo
+
+Uso: python bench_passwords.py [--method pbkdf2:sha256:600000] [--workers N] [--seconds 5]
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from werkzeug.security import check_password_hash, generate_password_hash
+from src.routes.passwords import PasswordHasher, DEFAULT_HASH_METHOD
+
+
+def run(method, workers, seconds):
+    hasher = PasswordHasher(method=method, workers=workers)
+    password = 'asteca2025'
+    password_hash = generate_password_hash(password, method)
+
+    # Mantém o pool cheio durante a janela de medição
+    in_flight = []
+    completed = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        while len(in_flight) < workers * 2:
+            in_flight.append(hasher.submit(check_password_hash, password_hash, password))
+        in_flight.pop(0).result()
+        completed += 1
+    for future in in_flight:
+        future.result()
+        completed += 1
+    elapsed = time.perf_counter() - started
+
+    rate = completed / elapsed
+    return {
+        'method': method,
+        'workers': workers,
+        'logins': completed,
+        'seconds': round(elapsed, 2),
+        'logins_per_second': round(rate, 1),
+        'logins_per_second_per_core': round(rate / workers, 1),
+        'ms_per_login': round(1000 * workers / rate, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--method', default=DEFAULT_HASH_METHOD)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    for workers in sorted({1, args.workers}):
+        result = run(args.method, workers, args.seconds)
+        print(' '.join(f'{key}={value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
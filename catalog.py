@@ -0,0 +1,160 @@
+from types import MappingProxyType
+from src.routes.search import SearchIndex
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'courses.json')
+
+# Intervalo mínimo (s) entre verificações de alteração do arquivo
+DEFAULT_CHECK_INTERVAL = 2.0
+
+REQUIRED_FIELDS = ('id', 'title', 'description', 'price', 'duration', 'modules', 'points_reward')
+
+logger = logging.getLogger(__name__)
+
+
+def duration_hours(duration):
+    """Horas de um texto como '16 horas' (0 se não houver número)"""
+    match = re.search(r'\d+', str(duration))
+    return int(match.group()) if match else 0
+
+
+class CatalogSnapshot:
+    """Versão imutável do catálogo, com índices montados uma vez no carregamento
+
+    Os cursos são os próprios dicts do arquivo, compartilhados por todas as
+    leituras: não devem ser modificados. Buscas por id e por faixa de
+    preço, duração ou pontos não criam cópias; a busca textual usa o
+    índice invertido montado junto com a versão.
+    """
+
+    # Campos com índice ordenado -> função que extrai o valor do curso
+    SORT_KEYS = {
+        'price': lambda course: course['price'],
+        'duration': lambda course: duration_hours(course['duration']),
+        'points_reward': lambda course: course['points_reward'],
+    }
+
+    def __init__(self, courses, version):
+        for course in courses:
+            missing = [field for field in REQUIRED_FIELDS if field not in course]
+            if missing:
+                raise ValueError(f"Curso {course.get('id')!r} sem os campos {', '.join(missing)}")
+        self.version = version
+        self.courses = tuple(courses)
+        self.by_id = MappingProxyType({course['id']: course for course in self.courses})
+        if len(self.by_id) != len(self.courses):
+            raise ValueError('Ids de curso repetidos no catálogo')
+        # id -> posição na ordem do arquivo (cursor das listagens paginadas)
+        self.positions = MappingProxyType({course['id']: index for index, course in enumerate(self.courses)})
+        # campo -> (valores ordenados, cursos na mesma ordem)
+        self._indexes = {}
+        for field, key in self.SORT_KEYS.items():
+            ordered = sorted(self.courses, key=lambda course: (key(course), course['id']))
+            self._indexes[field] = (tuple(key(course) for course in ordered), tuple(ordered))
+        self.search_index = SearchIndex(self.courses)
+
+    def __len__(self):
+        return len(self.courses)
+
+    def __contains__(self, course_id):
+        return course_id in self.by_id
+
+    def get(self, course_id):
+        return self.by_id.get(course_id)
+
+    def page_after(self, course_id, limit):
+        """Até limit cursos seguintes a course_id na ordem do arquivo (do início se None)
+
+        Só a fatia pedida é copiada. KeyError se o curso não existir mais.
+        """
+        start = 0 if course_id is None else self.positions[course_id] + 1
+        return self.courses[start:start + limit]
+
+    def ordered_by(self, field):
+        """Cursos em ordem crescente de price, duration ou points_reward"""
+        return self._indexes[field][1]
+
+    def between(self, field, low=None, high=None):
+        """Cursos com o campo entre low e high (inclusive), em ordem"""
+        values, ordered = self._indexes[field]
+        start = 0 if low is None else bisect.bisect_left(values, low)
+        stop = len(values) if high is None else bisect.bisect_right(values, high)
+        return ordered[start:stop]
+
+
+class CourseCatalog:
+    """Catálogo de cursos carregado de um arquivo JSON e recarregado ao mudar
+
+    snapshot() devolve a versão atual; no máximo a cada check_interval
+    segundos o mtime do arquivo é conferido e, se mudou, uma nova versão é
+    montada e trocada de uma vez (quem já tem a anterior continua com ela).
+    Um arquivo inválido é registrado no log e a versão anterior é mantida.
+    """
+
+    def __init__(self, path, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._stat = self._file_stat()
+        self._snapshot = self._load(self._stat)
+
+    def snapshot(self):
+        """Versão atual do catálogo"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._check(now)
+        return self._snapshot
+
+    def on_reload(self, listener):
+        """listener(snapshot) chamado após cada recarga"""
+        self._listeners.append(listener)
+
+    def reload(self):
+        """Recarregar o arquivo agora; retorna False se ele for inválido"""
+        with self._lock:
+            stat = self._file_stat()
+            try:
+                snapshot = self._load(stat)
+            except (OSError, ValueError) as error:
+                logger.error('Catálogo de cursos inválido em %s, mantendo a versão anterior: %s', self.path, error)
+                self._stat = stat
+                return False
+            self._stat = stat
+            self._snapshot = snapshot
+        for listener in self._listeners:
+            listener(snapshot)
+        return True
+
+    def _check(self, now):
+        if not self._lock.acquire(blocking=False):
+            return  # outra thread já está verificando
+        try:
+            self._checked_at = now
+            changed = self._file_stat() != self._stat
+        finally:
+            self._lock.release()
+        if changed:
+            self.reload()
+
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, stat):
+        with open(self.path, encoding='utf-8') as file:
+            courses = json.load(file)
+        return CatalogSnapshot(courses, version=stat)
+
+
+COURSE_CATALOG = CourseCatalog(CATALOG_PATH)
@@ -1,127 +1,59 @@
 from flask import Blueprint, request, jsonify
-import jwt
+from src.routes.auth_middleware import verify_token_decorator
+from src.routes.response_cache import RESPONSE_CACHE
+from src.routes.ranking import SharedLeaderboard, leaderboard_seed
+from src.routes.progress import ProgressStore
+from src.routes.badges import BadgeEngine
+from src.routes.auth import SEED_USERS
+from src.routes.user_directory import USER_DIRECTORY
+from src.routes.state import STATE
+from src.routes.catalog import COURSE_CATALOG, REQUIRED_FIELDS
+from src.routes.pagination import PageRequest, InvalidPageRequest
 import datetime
 
 courses_bp = Blueprint('courses', __name__)
 
-# Dados dos cursos disponíveis
-COURSES_DATA = {
-    'nr35': {
-        'id': 'nr35',
-        'title': 'NR-35 - Trabalho em Altura',
-        'description': 'Treinamento completo para trabalhos acima de 2 metros. Inclui teoria, prática e certificação válida por 2 anos.',
-        'price': 180.00,
-        'duration': '16 horas',
-        'modules': [
-            'Introdução à NR-35',
-            'Equipamentos de Proteção Individual',
-            'Sistemas de Ancoragem',
-            'Técnicas de Resgate',
-            'Prática Supervisionada',
-            'Avaliação Final'
-        ],
-        'points_reward': 50
-    },
-    'nr10': {
-        'id': 'nr10',
-        'title': 'NR-10 - Segurança em Eletricidade',
-        'description': 'Capacitação obrigatória para trabalhos com eletricidade. Ministrado por profissional bombeiro experiente.',
-        'price': 220.00,
-        'duration': '40 horas',
-        'modules': [
-            'Fundamentos de Eletricidade',
-            'Riscos Elétricos',
-            'Medidas de Proteção',
-            'Equipamentos de Segurança',
-            'Primeiros Socorros',
-            'Prática de Campo'
-        ],
-        'points_reward': 60
-    },
-    'nr18': {
-        'id': 'nr18',
-        'title': 'NR-18 - Construção Civil',
-        'description': 'Segurança específica para canteiros de obras. Ideal para pedreiros, pintores e operadores de máquinas.',
-        'price': 160.00,
-        'duration': '20 horas',
-        'modules': [
-            'Segurança em Canteiros',
-            'Proteção contra Quedas',
-            'Máquinas e Equipamentos',
-            'Sinalização de Segurança',
-            'Ordem e Limpeza',
-            'Avaliação Prática'
-        ],
-        'points_reward': 40
-    },
-    'primeiros-socorros': {
-        'id': 'primeiros-socorros',
-        'title': 'Primeiros Socorros',
-        'description': 'Aprenda a salvar vidas no ambiente de trabalho. Curso prático com simulações reais.',
-        'price': 120.00,
-        'duration': '12 horas',
-        'modules': [
-            'Avaliação da Vítima',
-            'Reanimação Cardiopulmonar',
-            'Controle de Hemorragias',
-            'Fraturas e Luxações',
-            'Queimaduras',
-            'Simulações Práticas'
-        ],
-        'points_reward': 30
-    },
-    'cipa': {
-        'id': 'cipa',
-        'title': 'CIPA - Comissão Interna',
-        'description': 'Formação completa para membros da CIPA. Desenvolva habilidades de liderança em segurança.',
-        'price': 280.00,
-        'duration': '20 horas',
-        'modules': [
-            'Legislação de Segurança',
-            'Análise de Riscos',
-            'Investigação de Acidentes',
-            'Comunicação Efetiva',
-            'Liderança em Segurança',
-            'Projeto Final'
-        ],
-        'points_reward': 70
-    },
-    'empilhadeira': {
-        'id': 'empilhadeira',
-        'title': 'Operador de Empilhadeira',
-        'description': 'Habilitação completa para operação segura de empilhadeiras. Teoria + prática + certificação.',
-        'price': 350.00,
-        'duration': '40 horas',
-        'modules': [
-            'Tipos de Empilhadeiras',
-            'Inspeção Diária',
-            'Técnicas de Operação',
-            'Segurança Operacional',
-            'Manutenção Básica',
-            'Prova Prática'
-        ],
-        'points_reward': 80
-    }
-}
-
-# Dados de ranking das equipes
+# Pontuação inicial das equipes (a posição é calculada pelo ranking)
 TEAM_RANKING = [
-    {'name': 'Equipe Construção A', 'members': 5, 'points': 1250, 'position': 1},
-    {'name': 'Pintores Pro', 'members': 4, 'points': 980, 'position': 2},
-    {'name': 'Equipe Operadores', 'members': 6, 'points': 750, 'position': 3},
-    {'name': 'Soldadores Unidos', 'members': 3, 'points': 620, 'position': 4},
-    {'name': 'Eletricistas Pro', 'members': 4, 'points': 580, 'position': 5}
+    {'name': 'Equipe Construção A', 'members': 5, 'points': 1250},
+    {'name': 'Pintores Pro', 'members': 4, 'points': 980},
+    {'name': 'Equipe Operadores', 'members': 6, 'points': 750},
+    {'name': 'Soldadores Unidos', 'members': 3, 'points': 620},
+    {'name': 'Eletricistas Pro', 'members': 4, 'points': 580}
 ]
 
-# Dados de ranking individual
+# Ranking individual pelo id do aluno (o nome é só exibido: dois alunos
+# podem ter o mesmo nome). Alunos fictícios da demonstração têm chaves com
+# prefixo, que nunca coincidem com o id de uma conta; os alunos de SEED_USERS
+# entram pelo id real quando são cadastrados (ver seed_user_ranking)
 INDIVIDUAL_RANKING = [
-    {'name': 'João Silva', 'team': 'Equipe Construção A', 'points': 320, 'position': 1},
-    {'name': 'Aluno Teste', 'team': 'Pintores Pro', 'points': 250, 'position': 2},
-    {'name': 'Maria Santos', 'team': 'Equipe Operadores', 'points': 180, 'position': 3},
-    {'name': 'Carlos Oliveira', 'team': 'Soldadores Unidos', 'points': 160, 'position': 4},
-    {'name': 'Ana Costa', 'team': 'Eletricistas Pro', 'points': 140, 'position': 5}
+    {'user_id': 'demo-joao-silva', 'name': 'João Silva', 'team': 'Equipe Construção A', 'points': 320},
+    {'user_id': 'demo-maria-santos', 'name': 'Maria Santos', 'team': 'Equipe Operadores', 'points': 180},
+    {'user_id': 'demo-carlos-oliveira', 'name': 'Carlos Oliveira', 'team': 'Soldadores Unidos', 'points': 160},
+    {'user_id': 'demo-ana-costa', 'name': 'Ana Costa', 'team': 'Eletricistas Pro', 'points': 140}
 ]
 
+# Rankings no estado compartilhado, mantidos em ordem em cada worker
+# (O(log n) por atualização)
+TEAM_LEADERBOARD = SharedLeaderboard(
+    STATE.namespace('ranking_teams', seed=lambda: leaderboard_seed(TEAM_RANKING)), key='name'
+)
+INDIVIDUAL_LEADERBOARD = SharedLeaderboard(
+    STATE.namespace(
+        'ranking_individual', seed=lambda: leaderboard_seed(INDIVIDUAL_RANKING, key='user_id')
+    ),
+    key='user_id'
+)
+
+# Quantidade padrão e máxima de posições por consulta de ranking
+DEFAULT_RANKING_LIMIT = 50
+MAX_RANKING_LIMIT = 100
+
+# Campos que podem ser pedidos em ?fields= em cada listagem
+TEAM_RANKING_FIELDS = ('name', 'members', 'points', 'position')
+INDIVIDUAL_RANKING_FIELDS = ('user_id', 'name', 'team', 'points', 'position')
+BADGE_FIELDS = ('id', 'name', 'description', 'icon', 'points_required', 'courses_required')
+
 # Badges disponíveis
 BADGES_DATA = {
     'safety_expert': {
@@ -129,7 +61,8 @@ BADGES_DATA = {
         'name': 'Especialista em Segurança',
         'description': 'Concluiu 3 cursos',
         'icon': 'badge-safety-expert.png',
-        'points_required': 150
+        'points_required': 150,
+        'courses_required': 3
     },
     'team_player': {
         'id': 'team_player',
@@ -150,140 +83,239 @@ BADGES_DATA = {
         'name': 'Mestre da Segurança',
         'description': 'Concluir todos os cursos',
         'icon': 'badge-safety-expert.png',
-        'points_required': 400
+        'points_required': 400,
+        'courses_required': 'all'
     }
 }
 
-def verify_token_decorator(f):
-    """Decorator para verificar token JWT"""
-    def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            payload = jwt.decode(token, 'secret_key', algorithms=['HS256'])
-            request.user_email = payload['email']
-            return f(*args, **kwargs)
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expirado'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token inválido'}), 401
-    
-    decorated_function.__name__ = f.__name__
-    return decorated_function
+# Ordem das badges na listagem e posição de cada uma (cursor da paginação)
+BADGE_IDS = tuple(BADGES_DATA)
+BADGE_POSITIONS = {badge_id: index for index, badge_id in enumerate(BADGE_IDS)}
+
+# Módulos já concluídos em cursos em andamento (dados de demonstração)
+PROGRESS_SEED = {
+    'teste@astecaseguranca.com.br': {'nr10': [1, 2, 3]}
+}
+
+# Log de conclusões de módulos com progresso agregado por usuário
+PROGRESS_STORE = ProgressStore(COURSE_CATALOG)
+# Regras de badges avaliadas a cada conclusão de módulo (as conquistadas ficam no perfil)
+BADGE_ENGINE = BadgeEngine(BADGES_DATA, len(COURSE_CATALOG.snapshot()))
+
+def on_catalog_reload(snapshot):
+    """Catálogo (courses.json) alterado: respostas montadas com a versão anterior deixam de valer"""
+    BADGE_ENGINE.set_total_courses(len(snapshot))
+    RESPONSE_CACHE.invalidate('courses')
+
+COURSE_CATALOG.on_reload(on_catalog_reload)
+
+for _email, _user in SEED_USERS.items():
+    PROGRESS_STORE.seed(_email, _user['points'], _user['completed_courses'], PROGRESS_SEED.get(_email))
+
+def seed_user_ranking(emails):
+    """Incluir no ranking individual, pelo id da conta, os alunos cadastrados que ainda não estão nele"""
+    for email in emails:
+        user = USER_DIRECTORY.get(email)
+        if user:
+            INDIVIDUAL_LEADERBOARD.namespace.setdefault(
+                str(user['id']), {'name': user['name'], 'team': user['team'], 'points': user['points']}
+            )
+    RESPONSE_CACHE.invalidate('ranking')
+
+def page_response(namespace, key, page, build):
+    """Primeira página pelo cache de respostas; as seguintes montadas a cada pedido
+
+    Páginas com cursor não vão para o cache: os cursores mudam a cada
+    alteração dos dados e as entradas antigas nunca seriam reaproveitadas.
+    """
+    if page.cursor is None:
+        return RESPONSE_CACHE.response(namespace, f'{key}:{page.cache_key}', build)
+    return jsonify(build()), 200
 
 @courses_bp.route('/courses', methods=['GET'])
 def get_courses():
-    """Obter lista de todos os cursos disponíveis"""
-    courses_list = []
-    for course_id, course_data in COURSES_DATA.items():
-        courses_list.append(course_data)
+    """Obter lista de cursos disponíveis (?limit=, ?cursor= e ?fields= opcionais)"""
+    catalog = COURSE_CATALOG.snapshot()
+    try:
+        page = PageRequest(request.args, REQUIRED_FIELDS)
+        after = page.cursor_value(id=str)
+    except InvalidPageRequest as error:
+        return jsonify({'error': str(error)}), 400
+    if after and after[0] not in catalog:
+        return jsonify({'error': 'cursor expirado, recomece a listagem'}), 400
+    
+    def build():
+        if page.paginated:
+            courses = catalog.page_after(after and after[0], page.limit + 1)
+        else:
+            courses = catalog.courses
+        courses, next_cursor = page.split(courses, lambda course: {'id': course['id']})
+        return {
+            'success': True,
+            'courses': page.project(courses),
+            'next_cursor': next_cursor
+        }
+    
+    return page_response('courses', 'list', page, build)
+
+@courses_bp.route('/search', methods=['GET'])
+def search_courses():
+    """Buscar cursos por título, descrição e módulos (sem acentos, por prefixo)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    results = COURSE_CATALOG.snapshot().search_index.search(query, limit)
     
     return jsonify({
         'success': True,
-        'courses': courses_list
+        'query': query,
+        'results': results
     }), 200
 
 @courses_bp.route('/courses/<course_id>', methods=['GET'])
 def get_course_details(course_id):
     """Obter detalhes de um curso específico"""
-    if course_id not in COURSES_DATA:
+    course = COURSE_CATALOG.snapshot().get(course_id)
+    if course is None:
         return jsonify({'error': 'Curso não encontrado'}), 404
     
-    return jsonify({
+    return RESPONSE_CACHE.response('courses', course_id, lambda: {
         'success': True,
-        'course': COURSES_DATA[course_id]
-    }), 200
+        'course': course
+    })
 
 @courses_bp.route('/user-progress', methods=['GET'])
 @verify_token_decorator
 def get_user_progress():
     """Obter progresso do usuário logado"""
-    # Dados simulados de progresso
-    user_progress = {
-        'completed_courses': ['nr35'],
-        'in_progress_courses': [
-            {
-                'course_id': 'nr10',
-                'progress': 65,
-                'current_module': 4,
-                'total_modules': 6
-            }
-        ],
-        'available_courses': ['nr18', 'primeiros-socorros', 'cipa', 'empilhadeira'],
-        'total_points': 250,
-        'level': 3,
-        'badges': ['safety_expert', 'team_player', 'perfect_attendance'],
-        'team': 'Pintores Pro',
-        'team_ranking': 2
-    }
+    user = USER_DIRECTORY.get(request.user_email)
+    if not user:
+        return jsonify({'error': 'Usuário não encontrado'}), 404
+    
+    # Agregado já materializado a cada conclusão de módulo
+    user_progress = PROGRESS_STORE.get(request.user_email, user)
+    user_progress['badges'] = user['badges']
+    user_progress['team'] = user['team']
+    user_progress['team_ranking'] = TEAM_LEADERBOARD.rank(user['team'])
     
     return jsonify({
         'success': True,
         'progress': user_progress
     }), 200
 
+def ranking_page(name, leaderboard, fields):
+    """Página do ranking a partir do cursor (pontos e id do último item visto)"""
+    try:
+        page = PageRequest(request.args, fields, default_limit=DEFAULT_RANKING_LIMIT,
+                           max_limit=MAX_RANKING_LIMIT, always_paginate=True)
+        points, member_id = page.cursor_value(p=int, m=str) or (None, None)
+    except InvalidPageRequest as error:
+        return jsonify({'error': str(error)}), 400
+    
+    def build():
+        entries, next_cursor = page.split(
+            leaderboard.page_after(points, member_id, page.limit + 1),
+            lambda entry: {'p': entry['points'], 'm': entry[leaderboard.key]}
+        )
+        return {
+            'success': True,
+            'ranking': page.project(entries),
+            'next_cursor': next_cursor
+        }
+    
+    return page_response('ranking', name, page, build)
+
 @courses_bp.route('/ranking/teams', methods=['GET'])
 def get_team_ranking():
     """Obter ranking das equipes"""
-    return jsonify({
-        'success': True,
-        'ranking': TEAM_RANKING
-    }), 200
+    return ranking_page('teams', TEAM_LEADERBOARD, TEAM_RANKING_FIELDS)
 
 @courses_bp.route('/ranking/individual', methods=['GET'])
 def get_individual_ranking():
     """Obter ranking individual"""
+    return ranking_page('individual', INDIVIDUAL_LEADERBOARD, INDIVIDUAL_RANKING_FIELDS)
+
+@courses_bp.route('/ranking/me', methods=['GET'])
+@verify_token_decorator
+def get_my_ranking():
+    """Obter posição do usuário logado e de sua equipe, com os vizinhos"""
+    user = USER_DIRECTORY.get(request.user_email)
+    if not user:
+        return jsonify({'error': 'Usuário não encontrado'}), 404
+    
+    radius = min(max(request.args.get('radius', 2, type=int), 0), 10)
+    
     return jsonify({
         'success': True,
-        'ranking': INDIVIDUAL_RANKING
+        'individual': {
+            'position': INDIVIDUAL_LEADERBOARD.rank(str(user['id'])),
+            'total': len(INDIVIDUAL_LEADERBOARD),
+            'neighbors': INDIVIDUAL_LEADERBOARD.around(str(user['id']), radius)
+        },
+        'team': {
+            'position': TEAM_LEADERBOARD.rank(user['team']),
+            'total': len(TEAM_LEADERBOARD),
+            'neighbors': TEAM_LEADERBOARD.around(user['team'], radius)
+        }
     }), 200
 
 @courses_bp.route('/badges', methods=['GET'])
 def get_badges():
-    """Obter lista de badges disponíveis"""
-    badges_list = []
-    for badge_id, badge_data in BADGES_DATA.items():
-        badges_list.append(badge_data)
+    """Obter lista de badges disponíveis (?limit=, ?cursor= e ?fields= opcionais)"""
+    try:
+        page = PageRequest(request.args, BADGE_FIELDS)
+        after = page.cursor_value(id=str)
+    except InvalidPageRequest as error:
+        return jsonify({'error': str(error)}), 400
+    if after and after[0] not in BADGE_POSITIONS:
+        return jsonify({'error': 'cursor inválido'}), 400
     
-    return jsonify({
-        'success': True,
-        'badges': badges_list
-    }), 200
+    def build():
+        if page.paginated:
+            start = BADGE_POSITIONS[after[0]] + 1 if after else 0
+            badge_ids = BADGE_IDS[start:start + page.limit + 1]
+        else:
+            badge_ids = BADGE_IDS
+        badges, next_cursor = page.split(
+            (BADGES_DATA[badge_id] for badge_id in badge_ids), lambda badge: {'id': badge['id']}
+        )
+        return {
+            'success': True,
+            'badges': page.project(badges),
+            'next_cursor': next_cursor
+        }
+    
+    return page_response('badges', 'list', page, build)
 
 @courses_bp.route('/user-badges', methods=['GET'])
 @verify_token_decorator
 def get_user_badges():
     """Obter badges do usuário logado"""
-    user_badges = ['safety_expert', 'team_player', 'perfect_attendance']
-    
-    badges_details = []
-    for badge_id in user_badges:
-        if badge_id in BADGES_DATA:
-            badges_details.append(BADGES_DATA[badge_id])
+    user = USER_DIRECTORY.get(request.user_email)
+    if not user:
+        return jsonify({'error': 'Usuário não encontrado'}), 404
     
     return jsonify({
         'success': True,
-        'user_badges': badges_details,
-        'available_badges': [badge for badge_id, badge in BADGES_DATA.items() if badge_id not in user_badges]
+        'user_badges': [BADGES_DATA[badge_id] for badge_id in user['badges'] if badge_id in BADGES_DATA],
+        'available_badges': [BADGES_DATA[badge_id] for badge_id in BADGE_ENGINE.available(user['badges'])]
     }), 200
 
 @courses_bp.route('/enroll/<course_id>', methods=['POST'])
 @verify_token_decorator
 def enroll_course(course_id):
     """Inscrever usuário em um curso"""
-    if course_id not in COURSES_DATA:
+    course = COURSE_CATALOG.snapshot().get(course_id)
+    if course is None:
         return jsonify({'error': 'Curso não encontrado'}), 404
     
     # Simular inscrição
     return jsonify({
         'success': True,
-        'message': f'Inscrição no curso {COURSES_DATA[course_id]["title"]} realizada com sucesso!',
-        'course': COURSES_DATA[course_id]
+        'message': f'Inscrição no curso {course["title"]} realizada com sucesso!',
+        'course': course
     }), 200
 
 @courses_bp.route('/complete-module', methods=['POST'])
@@ -298,16 +330,55 @@ def complete_module():
     course_id = data['course_id']
     module_id = data['module_id']
     
-    if course_id not in COURSES_DATA:
+    if course_id not in COURSE_CATALOG.snapshot():
         return jsonify({'error': 'Curso não encontrado'}), 404
     
-    # Simular conclusão de módulo e ganho de pontos
-    points_earned = 10
+    total_modules = PROGRESS_STORE.total_modules(course_id)
+    if not isinstance(module_id, int) or not 1 <= module_id <= total_modules:
+        return jsonify({'error': f'module_id deve ser um número entre 1 e {total_modules}'}), 400
+    
+    user = USER_DIRECTORY.get(request.user_email)
+    if not user:
+        return jsonify({'error': 'Usuário não encontrado'}), 404
+    
+    # Registrar o evento; o agregado do usuário é atualizado na mesma operação
+    event = PROGRESS_STORE.record_module_completion(request.user_email, course_id, module_id, user)
+    if event is None:
+        return jsonify({'error': 'Módulo já concluído'}), 409
+    
+    progress = PROGRESS_STORE.get(request.user_email, user)
+    
+    # Só as regras cujo limiar foi cruzado por este evento são avaliadas
+    # (estado anterior derivado do próprio evento, não de uma leitura antiga)
+    completed_count = len(progress['completed_courses'])
+    new_badges = BADGE_ENGINE.evaluate(
+        user['badges'],
+        (progress['total_points'] - event['points'], completed_count - event['course_completed']),
+        (progress['total_points'], completed_count)
+    )
+    # Pontos e cursos vêm do agregado gravado no banco; as badges do perfil
+    # só ganham as novas
+    user = USER_DIRECTORY.update(
+        request.user_email,
+        badges=user['badges'] + new_badges,
+        points=progress['total_points'],
+        level=progress['level'],
+        completed_courses=progress['completed_courses']
+    )
+    
+    # Pontos para o aluno e sua equipe
+    points_earned = event['points']
+    INDIVIDUAL_LEADERBOARD.set_points(str(user['id']), user['points'], name=user['name'], team=user['team'])
+    if user['team']:
+        TEAM_LEADERBOARD.add_points(user['team'], points_earned)
+    RESPONSE_CACHE.invalidate('ranking')
     
     return jsonify({
         'success': True,
         'message': f'Módulo concluído! Você ganhou {points_earned} pontos.',
         'points_earned': points_earned,
-        'new_total_points': 260  # Simulado
+        'new_total_points': user['points'],
+        'course_completed': event['course_completed'],
+        'new_badges': [BADGES_DATA[badge_id] for badge_id in new_badges]
     }), 200
 
@@ -0,0 +1,436 @@
+from sqlalchemy import func, inspect, literal, or_, select, tuple_, union_all
+from sqlalchemy.exc import IntegrityError, OperationalError
+from src.models.user import db
+import datetime
+import threading
+
+# Status que não ocupam horário
+INACTIVE_STATUSES = ('cancelled',)
+
+# Campos de Exam.to_dict (projeção ?fields= das listagens)
+EXAM_FIELDS = ('id', 'user_email', 'course_id', 'course_name', 'date', 'time', 'status', 'notes', 'created_at', 'seat')
+# Campos devolvidos pela API: as colunas e o nome da sala do lugar (seat)
+EXAM_RESPONSE_FIELDS = EXAM_FIELDS + ('room',)
+
+# Provas passadas ficam na tabela quente por mais estes dias (para o status
+# final ser registrado) antes de irem para o arquivo
+ARCHIVE_AFTER_DAYS = 7
+# Agendamentos movidos por transação na compactação
+COMPACTION_BATCH_SIZE = 500
+
+# Novas tentativas quando outro worker ocupa o mesmo lugar ao mesmo tempo
+BOOKING_ATTEMPTS = 3
+
+
+class ExamColumns:
+    """Colunas comuns aos agendamentos ativos e arquivados"""
+    user_email = db.Column(db.String(120), nullable=False, index=True)
+    course_id = db.Column(db.String(50), nullable=False)
+    course_name = db.Column(db.String(120), nullable=False)
+    date = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD
+    time = db.Column(db.String(5), nullable=False)  # HH:MM
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    notes = db.Column(db.Text, nullable=False, default='')
+    created_at = db.Column(db.String(32), nullable=False)
+    # Examinador/sala no horário e lugar dentro do limite do curso
+    seat = db.Column(db.Integer, nullable=False, default=0)
+    course_seat = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in EXAM_FIELDS}
+
+
+class Exam(ExamColumns, db.Model):
+    """Agendamento de prova prática (partição quente: o que ocupa horário)"""
+    __tablename__ = 'scheduled_exams'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+
+    __table_args__ = (
+        db.Index('ix_scheduled_exams_user_slot', 'user_email', 'date', 'time'),
+        # Garantem no banco a capacidade de cada horário ativo (uma prova por
+        # sala e o limite do curso), mesmo com vários workers gravando
+        db.Index(
+            'uq_scheduled_exams_active_seat', 'date', 'time', 'seat', unique=True,
+            sqlite_where=db.text("status != 'cancelled'"),
+            postgresql_where=db.text("status != 'cancelled'")
+        ),
+        db.Index(
+            'uq_scheduled_exams_active_course_seat', 'date', 'time', 'course_id', 'course_seat', unique=True,
+            sqlite_where=db.text("status != 'cancelled'"),
+            postgresql_where=db.text("status != 'cancelled'")
+        ),
+        # Um aluno não faz duas provas ativas no mesmo horário
+        db.Index(
+            'uq_scheduled_exams_active_user_slot', 'user_email', 'date', 'time', unique=True,
+            sqlite_where=db.text("status != 'cancelled'"),
+            postgresql_where=db.text("status != 'cancelled'")
+        ),
+        # Ids não são reutilizados depois que o último agendamento é arquivado
+        {'sqlite_autoincrement': True},
+    )
+
+
+class ArchivedExam(ExamColumns, db.Model):
+    """Agendamento passado ou cancelado, movido pela compactação
+
+    month (YYYY-MM da prova) é a chave de partição por tempo do arquivo,
+    indexada para consultas e limpezas de um período inteiro.
+    """
+    __tablename__ = 'scheduled_exams_archive'
+
+    archive_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id = db.Column(db.Integer, nullable=False, index=True)
+    month = db.Column(db.String(7), nullable=False, index=True)
+    archived_at = db.Column(db.String(32), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_scheduled_exams_archive_user_slot', 'user_email', 'date', 'time'),
+    )
+
+
+class ExamStore:
+    """Acesso aos agendamentos no banco, apoiado nos índices de Exam
+
+    capacity (SlotCapacity) define quantas provas cabem em cada horário;
+    outbox (NotificationOutbox), se informado, recebe um evento por
+    reserva, reagendamento ou mudança de status, gravado no mesmo commit.
+    """
+
+    def __init__(self, capacity, outbox=None):
+        self.capacity = capacity
+        self.outbox = outbox
+
+    def seed(self, exams):
+        """Inserir agendamentos de demonstração se não houver nenhum (ativo ou arquivado)"""
+        if db.session.query(Exam.id).first() is not None or db.session.query(ArchivedExam.id).first() is not None:
+            return
+        for exam in exams:
+            db.session.add(Exam(**exam))
+        # Outro worker pode ter inserido os mesmos dados ao mesmo tempo
+        self._commit()
+
+    def upgrade_schema(self):
+        """Adicionar colunas de lugar e índices que faltam em bancos criados por versões anteriores"""
+        columns = {column['name'] for column in inspect(db.engine).get_columns(Exam.__tablename__)}
+        if 'seat' not in columns:
+            with db.engine.begin() as connection:
+                connection.execute(db.text('DROP INDEX IF EXISTS uq_scheduled_exams_active_slot'))
+                connection.execute(db.text('ALTER TABLE scheduled_exams ADD COLUMN seat INTEGER NOT NULL DEFAULT 0'))
+                connection.execute(db.text('ALTER TABLE scheduled_exams ADD COLUMN course_seat INTEGER NOT NULL DEFAULT 0'))
+        for index in Exam.__table__.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except IntegrityError:
+                # Provas em conflito gravadas antes do índice: book() e move()
+                # continuam conferindo o horário do aluno antes de gravar
+                pass
+
+    def get(self, exam_id):
+        """Buscar agendamento pelo id"""
+        exam = db.session.get(Exam, exam_id)
+        return self._to_dict(exam) if exam else None
+
+    def busy_slots(self, user_emails, start_date, end_date):
+        """Horários com prova ativa de cada aluno no intervalo: {email: {(data, hora)}}"""
+        rows = (
+            self._active()
+            .filter(Exam.user_email.in_(user_emails), Exam.date >= start_date, Exam.date <= end_date)
+            .with_entities(Exam.user_email, Exam.date, Exam.time)
+        )
+        busy = {}
+        for user_email, date, time in rows:
+            busy.setdefault(user_email, set()).add((date, time))
+        return busy
+
+    def user_busy(self, user_email, date, time, exclude_id=None):
+        """True se o aluno já tem prova ativa na data e hora (fora exclude_id)"""
+        query = self._active().filter(Exam.user_email == user_email, Exam.date == date, Exam.time == time)
+        if exclude_id is not None:
+            query = query.filter(Exam.id != exclude_id)
+        return db.session.query(query.exists()).scalar()
+
+    def usage(self, date):
+        """Provas ativas por horário e curso em uma data: {hora: {curso: n}}"""
+        return self.usage_between(date, date).get(date, {})
+
+    def usage_between(self, start_date, end_date):
+        """Provas ativas por data, horário e curso no intervalo, em uma consulta agrupada
+
+        Retorna {data: {hora: {curso: n}}}; com ele a capacidade restante de
+        cada horário é uma conta sobre contadores (ver SlotCapacity).
+        """
+        rows = (
+            self._active()
+            .filter(Exam.date >= start_date, Exam.date <= end_date)
+            .with_entities(Exam.date, Exam.time, Exam.course_id, func.count(Exam.id))
+            .group_by(Exam.date, Exam.time, Exam.course_id)
+        )
+        usage = {}
+        for date, time, course_id, count in rows:
+            usage.setdefault(date, {}).setdefault(time, {})[course_id] = count
+        return usage
+
+    def for_user(self, user_email, limit=None, after=None, include_history=False):
+        """Agendamentos do usuário ordenados por data e hora
+
+        Com limit, devolve no máximo limit agendamentos posteriores a after
+        (date, time, id), usando o índice (user_email, date, time) sem
+        percorrer os anteriores. O arquivo só é lido com include_history.
+        """
+        query = self._user_exams(Exam, user_email, limit, after)
+        if include_history:
+            # Cada lado já vem ordenado e limitado pelo próprio índice (entre
+            # parênteses, pois o SQLite não aceita ORDER BY/LIMIT em cada SELECT da união)
+            archived = self._user_exams(ArchivedExam, user_email, limit, after)
+            merged = union_all(select(query.subquery()), select(archived.subquery())).subquery()
+            query = select(merged).order_by(merged.c.date, merged.c.time, merged.c.id)
+            if limit is not None:
+                query = query.limit(limit)
+        return [self._with_room(dict(row)) for row in db.session.execute(query).mappings()]
+
+    @staticmethod
+    def _user_exams(model, user_email, limit, after):
+        query = select(*(getattr(model, field) for field in EXAM_FIELDS)).where(model.user_email == user_email)
+        if after is not None:
+            query = query.where(tuple_(model.date, model.time, model.id) > tuple_(*after))
+        query = query.order_by(model.date, model.time, model.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    def iter_exams(self, start_date=None, end_date=None, course_id=None, user_emails=None,
+                   include_history=False, chunk_size=500):
+        """Agendamentos filtrados, lidos do banco em lotes de chunk_size (exportação)
+
+        user_emails é uma subquery de emails (ex.: os alunos de uma equipe).
+        As linhas são entregues conforme chegam do cursor, sem montar a
+        lista inteira em memória.
+        """
+        def exams(model):
+            query = select(*(getattr(model, field) for field in EXAM_FIELDS))
+            if start_date:
+                query = query.where(model.date >= start_date)
+            if end_date:
+                query = query.where(model.date <= end_date)
+            if course_id:
+                query = query.where(model.course_id == course_id)
+            if user_emails is not None:
+                query = query.where(model.user_email.in_(user_emails))
+            return query
+
+        query = exams(Exam)
+        if include_history:
+            query = union_all(query, exams(ArchivedExam))
+        merged = query.subquery()
+        query = select(merged).order_by(merged.c.date, merged.c.time, merged.c.id)
+        result = db.session.execute(query.execution_options(yield_per=chunk_size))
+        for row in result.mappings():
+            yield self._with_room(dict(row))
+
+    def compact(self, today=None, archive_after_days=ARCHIVE_AFTER_DAYS, batch_size=COMPACTION_BATCH_SIZE):
+        """Mover para o arquivo as provas canceladas e as passadas; retorna quantas foram movidas
+
+        Cada lote é copiado e removido na mesma transação, com a condição
+        reavaliada nas duas instruções: um agendamento reagendado por outro
+        pedido no meio da compactação continua na tabela quente.
+        """
+        today = today or datetime.date.today()
+        cutoff = (today - datetime.timedelta(days=archive_after_days)).isoformat()
+        archivable = or_(Exam.status.in_(INACTIVE_STATUSES), Exam.date < cutoff)
+        columns = EXAM_FIELDS + ('course_seat',)
+        moved = 0
+        while True:
+            ids = [
+                exam_id for exam_id, in
+                db.session.query(Exam.id).filter(archivable).order_by(Exam.id).limit(batch_size).with_for_update()
+            ]
+            if not ids:
+                break
+            batch = Exam.__table__.c.id.in_(ids)
+            archived_at = datetime.datetime.now().isoformat()
+            db.session.execute(ArchivedExam.__table__.insert().from_select(
+                columns + ('month', 'archived_at'),
+                select(
+                    *(Exam.__table__.c[column] for column in columns),
+                    func.substr(Exam.date, 1, 7),
+                    literal(archived_at)
+                ).where(batch, archivable)
+            ))
+            moved += db.session.execute(Exam.__table__.delete().where(batch, archivable)).rowcount
+            db.session.commit()
+            if len(ids) < batch_size:
+                break
+        return moved
+
+    def book(self, exam):
+        """Inserir agendamento; retorna None se o horário estiver lotado ou o aluno já tiver prova nele"""
+        for _ in range(BOOKING_ATTEMPTS):
+            if self.user_busy(exam['user_email'], exam['date'], exam['time']):
+                return None
+            new_exam = Exam(**exam)
+            if not self._assign_seats([new_exam]):
+                return None
+            db.session.add(new_exam)
+            if self._commit([('exam_booked', new_exam)]):
+                return self._to_dict(new_exam)
+        return None
+
+    def book_many(self, exams):
+        """Inserir vários agendamentos em uma transação (tudo ou nada)
+
+        Retorna None se algum horário estiver lotado ou for ocupado por outro
+        pedido durante a gravação; nesse caso nenhum agendamento é gravado.
+        """
+        new_exams = [Exam(**exam) for exam in exams]
+        if not self._assign_seats(new_exams):
+            return None
+        db.session.add_all(new_exams)
+        if not self._commit([('exam_booked', exam) for exam in new_exams]):
+            return None
+        return [self._to_dict(exam) for exam in new_exams]
+
+    def move(self, exam_id, date, time, status=None):
+        """Mover agendamento para outro horário; retorna None se o horário estiver lotado
+
+        Também retorna None se o aluno já tiver outra prova no horário.
+        """
+        for _ in range(BOOKING_ATTEMPTS):
+            exam = db.session.get(Exam, exam_id)
+            if self.user_busy(exam.user_email, date, time, exclude_id=exam_id):
+                return None
+            exam.date = date
+            exam.time = time
+            if status is not None:
+                exam.status = status
+            if not self._assign_seats([exam], exclude_id=exam_id):
+                db.session.rollback()
+                return None
+            if self._commit([('exam_rescheduled', exam)]):
+                return self._to_dict(exam)
+        return None
+
+    def set_status(self, exam_id, status):
+        """Alterar status do agendamento; None se ele já estava nesse status
+
+        A troca é condicional no próprio UPDATE: de dois pedidos simultâneos
+        só um altera o status e grava o evento no outbox.
+        """
+        updated = (
+            Exam.query.filter(Exam.id == exam_id, Exam.status != status)
+            .update({'status': status}, synchronize_session=False)
+        )
+        if not updated:
+            db.session.rollback()
+            return None
+        exam = db.session.get(Exam, exam_id, populate_existing=True)
+        if not self._commit([(f'exam_{status}', exam)]):
+            return None
+        return self._to_dict(exam)
+
+    def _assign_seats(self, exams, exclude_id=None):
+        """Escolher sala e lugar do curso livres para cada prova; False se algum horário lotar"""
+        # Sem autoflush: as provas ainda não têm lugar e não devem ir ao banco agora
+        with db.session.no_autoflush:
+            query = self._active().filter(
+                Exam.date.in_({exam.date for exam in exams}),
+                Exam.time.in_({exam.time for exam in exams})
+            )
+            if exclude_id is not None:
+                query = query.filter(Exam.id != exclude_id)
+            rows = query.with_entities(Exam.date, Exam.time, Exam.course_id, Exam.seat, Exam.course_seat)
+
+            # (data, hora) -> (salas ocupadas, {curso: lugares ocupados})
+            used = {}
+            for date, time, course_id, seat, course_seat in rows:
+                seats, course_seats = used.setdefault((date, time), (set(), {}))
+                seats.add(seat)
+                course_seats.setdefault(course_id, set()).add(course_seat)
+
+        for exam in exams:
+            seats, course_seats = used.setdefault((exam.date, exam.time), (set(), {}))
+            taken = course_seats.setdefault(exam.course_id, set())
+            seat = next((s for s in range(self.capacity.seats) if s not in seats), None)
+            course_seat = next(
+                (s for s in range(self.capacity.course_limit(exam.course_id)) if s not in taken), None
+            )
+            if seat is None or course_seat is None:
+                return False
+            exam.seat = seat
+            exam.course_seat = course_seat
+            seats.add(seat)
+            taken.add(course_seat)
+        return True
+
+    def _to_dict(self, exam):
+        return self._with_room(exam.to_dict())
+
+    def _with_room(self, exam):
+        exam['room'] = self.capacity.room(exam['seat'])
+        return exam
+
+    @staticmethod
+    def _active():
+        return Exam.query.filter(Exam.status.notin_(INACTIVE_STATUSES))
+
+    def _commit(self, events=()):
+        # A violação de um índice único indica que outro worker ocupou o lugar
+        try:
+            if events and self.outbox is not None:
+                # flush antes para que o payload leve o id do agendamento
+                db.session.flush()
+                for event, exam in events:
+                    self.outbox.add(event, self._to_dict(exam))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+
+
+class ExamCompactor:
+    """Thread que roda ExamStore.compact() periodicamente
+
+    Vários workers podem rodá-la ao mesmo tempo: cada lote é movido em uma
+    transação e quem chegar depois não encontra mais o que mover.
+    """
+
+    def __init__(self, app, store, interval=3600.0, archive_after_days=ARCHIVE_AFTER_DAYS):
+        self.app = app
+        self.store = store
+        self.interval = interval
+        self.archive_after_days = archive_after_days
+        self.moved = 0
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='exam-compaction', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {'moved': self.moved, 'last_run': self.last_run}
+
+    def run_once(self):
+        with self.app.app_context():
+            moved = self.store.compact(archive_after_days=self.archive_after_days)
+        self.moved += moved
+        self.last_run = datetime.datetime.now().isoformat()
+        return moved
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except OperationalError:
+                pass  # Tabela ainda não criada ou banco ocupado: tenta no próximo ciclo
+            except Exception:
+                self.app.logger.exception('Falha na compactação dos agendamentos')
+            self._stop.wait(self.interval)
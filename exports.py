@@ -0,0 +1,164 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from src.routes.auth_middleware import admin_required
+from src.routes.exam_store import EXAM_RESPONSE_FIELDS
+from src.routes.scheduling import EXAM_STORE
+from src.routes.courses import PROGRESS_STORE, TEAM_LEADERBOARD, INDIVIDUAL_LEADERBOARD
+from src.routes.user_directory import USER_DIRECTORY
+import csv
+import datetime
+import io
+import json
+
+exports_bp = Blueprint('exports', __name__)
+
+# Linhas lidas por vez do banco ou do ranking durante a exportação
+EXPORT_CHUNK_SIZE = 500
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+PROGRESS_FIELDS = ('seq', 'timestamp', 'user_email', 'team', 'course_id', 'module_id', 'points', 'course_completed')
+RANKING_FIELDS = {
+    'teams': ('position', 'name', 'members', 'points'),
+    'individual': ('position', 'user_id', 'name', 'team', 'points')
+}
+
+
+def encode_rows(rows, fields, export_format):
+    """Linhas serializadas uma a uma (CSV com cabeçalho ou NDJSON)"""
+    if export_format == 'ndjson':
+        for row in rows:
+            yield json.dumps({field: row.get(field) for field in fields}, ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([row.get(field) for field in fields])
+        # O buffer só guarda a linha atual
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_export(name, rows, fields, export_format):
+    """Resposta que envia as linhas conforme são geradas
+
+    O contexto do request (sessão do banco) fica aberto enquanto o gerador
+    roda; a memória usada não depende do número de linhas.
+    """
+    filename = f"{name}-{datetime.date.today().isoformat()}.{export_format}"
+    return Response(
+        stream_with_context(encode_rows(rows, fields, export_format)),
+        mimetype=FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+def export_params():
+    """Formato e filtros comuns (?format=, ?from=, ?to=, ?team=, ?course_id=)
+
+    Levanta ValueError com a mensagem de erro para o cliente.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATS:
+        raise ValueError(f"format deve ser {' ou '.join(FORMATS)}")
+
+    dates = {}
+    for param in ('from', 'to'):
+        value = request.args.get(param)
+        if value:
+            try:
+                datetime.datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f'Formato de data inválido em {param}. Use YYYY-MM-DD')
+        dates[param] = value
+
+    return {
+        'format': export_format,
+        'start_date': dates['from'],
+        'end_date': dates['to'],
+        'team': request.args.get('team') or None,
+        'course_id': request.args.get('course_id') or None
+    }
+
+
+@exports_bp.route('/exams', methods=['GET'])
+@admin_required
+def export_exams():
+    """Exportar agendamentos (com ?include_history=1 inclui os arquivados)"""
+    try:
+        params = export_params()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    rows = EXAM_STORE.iter_exams(
+        start_date=params['start_date'],
+        end_date=params['end_date'],
+        course_id=params['course_id'],
+        user_emails=USER_DIRECTORY.team_emails(params['team']) if params['team'] else None,
+        include_history=request.args.get('include_history') in ('1', 'true'),
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    return stream_export('agendamentos', rows, EXAM_RESPONSE_FIELDS, params['format'])
+
+
+@exports_bp.route('/progress', methods=['GET'])
+@admin_required
+def export_progress():
+    """Exportar conclusões de módulos (com ?completed_only=1 só as que concluíram o curso)"""
+    try:
+        params = export_params()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    completed_only = request.args.get('completed_only') in ('1', 'true')
+
+    def rows():
+        events = PROGRESS_STORE.iter_events(
+            start_date=params['start_date'],
+            end_date=params['end_date'],
+            course_id=params['course_id'],
+            completed_only=completed_only,
+            chunk_size=EXPORT_CHUNK_SIZE
+        )
+        for event in events:
+            # Perfis vêm do cache do diretório: alunos com vários eventos custam uma leitura
+            user = USER_DIRECTORY.get(event['user_email'])
+            team = user['team'] if user else ''
+            if params['team'] and team != params['team']:
+                continue
+            yield dict(event, team=team)
+
+    return stream_export('progresso', rows(), PROGRESS_FIELDS, params['format'])
+
+
+@exports_bp.route('/rankings/<kind>', methods=['GET'])
+@admin_required
+def export_ranking(kind):
+    """Exportar o ranking de equipes (teams) ou individual (individual), com ?team= opcional"""
+    if kind not in RANKING_FIELDS:
+        return jsonify({'error': 'Ranking deve ser teams ou individual'}), 404
+    try:
+        params = export_params()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    leaderboard = TEAM_LEADERBOARD if kind == 'teams' else INDIVIDUAL_LEADERBOARD
+    team_field = 'name' if kind == 'teams' else 'team'
+
+    def rows():
+        # Lê o ranking em blocos a partir do último item visto, como a paginação
+        points = member_id = None
+        while True:
+            entries = leaderboard.page_after(points, member_id, EXPORT_CHUNK_SIZE)
+            for entry in entries:
+                if not params['team'] or entry.get(team_field) == params['team']:
+                    yield entry
+            if len(entries) < EXPORT_CHUNK_SIZE:
+                return
+            points, member_id = entries[-1]['points'], entries[-1][leaderboard.key]
+
+    return stream_export(f'ranking-{kind}', rows(), RANKING_FIELDS[kind], params['format'])
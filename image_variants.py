@@ -0,0 +1,217 @@
+import bisect
+import hashlib
+import io
+import os
+import threading
+import time
+
+from src.routes.static_assets import StaticAsset
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow é opcional; sem ele as imagens originais são servidas
+    Image = None
+    features = None
+
+# Larguras geradas (só as menores que a imagem original, mais a própria largura)
+IMAGE_WIDTHS = (64, 128, 256, 512, 1024)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Lock de geração mais antigo que isto (s) é de um processo que morreu
+BUILD_LOCK_TIMEOUT = 600
+
+# Tamanhos nomeados aceitos em ?icon=
+ICON_SIZES = {'sm': 64, 'md': 128, 'lg': 256}
+
+# formato -> (extensão, content type, parâmetros de gravação), em ordem de preferência
+VARIANT_FORMATS = {
+    'avif': ('avif', 'image/avif', {'quality': 50}),
+    'webp': ('webp', 'image/webp', {'quality': 80, 'method': 6}),
+}
+FALLBACK_FORMATS = {
+    'png': ('png', 'image/png', {'optimize': True}),
+    'jpeg': ('jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def supported_formats():
+    """Formatos modernos que o Pillow instalado consegue gravar"""
+    if Image is None:
+        return []
+    supported = []
+    for name in VARIANT_FORMATS:
+        try:
+            if features.check(name):
+                supported.append(name)
+        except ValueError:  # Pillow antigo não conhece o formato
+            pass
+    return supported
+
+
+class ImageVariants:
+    """Versões redimensionadas e recodificadas das imagens estáticas
+
+    As variantes ficam em cache no disco em <cache_dir>/<hash da origem>/,
+    então só são geradas de novo quando a imagem original muda. load() só
+    indexa o que já está no disco (rápido, na inicialização); build() gera
+    o que falta, fora da inicialização (comando build-image-variants ou
+    thread em segundo plano). Enquanto uma imagem não tem variantes, a
+    original é servida.
+    """
+
+    def __init__(self, cache_dir, widths=IMAGE_WIDTHS):
+        self.cache_dir = cache_dir
+        self.widths = widths
+        # caminho original -> ([larguras], [{formato: StaticAsset}])
+        self._variants = {}
+
+    def load(self, manifest):
+        """Indexar as variantes já geradas no disco, sem codificar nada"""
+        variants = {}
+        for asset in self._images(manifest):
+            indexed = self._index(asset)
+            if indexed is not None:
+                variants[asset.path] = indexed
+        self._variants = variants
+
+    def build(self, manifest):
+        """Gerar as variantes que faltam e indexá-las, imagem por imagem
+
+        Cada imagem é gerada por um só processo (lock no diretório dela);
+        os demais esperam o lock ser liberado e só indexam o resultado.
+        """
+        if Image is None:
+            return
+        formats = supported_formats()
+        for asset in self._images(manifest):
+            self._build_image(asset, formats)
+            indexed = self._index(asset)
+            if indexed is not None:
+                # Troca o dict inteiro: requests em andamento continuam com o anterior
+                self._variants = dict(self._variants, **{asset.path: indexed})
+
+    def start_build(self, manifest, logger):
+        """build() em uma thread, para não atrasar a inicialização nem os requests"""
+        def run():
+            try:
+                self.build(manifest)
+            except Exception:
+                logger.exception('Falha ao gerar as variantes de imagem')
+
+        threading.Thread(target=run, name='image-variants', daemon=True).start()
+
+    def __len__(self):
+        return len(self._variants)
+
+    def has_variants(self, path):
+        return path in self._variants
+
+    def select(self, path, width, accepted_types):
+        """Menor variante com largura >= width no melhor formato aceito
+
+        accepted_types são os content types listados explicitamente no
+        cabeçalho Accept (*/* não conta, para não enviar AVIF a quem não pediu).
+        """
+        widths, by_width = self._variants[path]
+        index = min(bisect.bisect_left(widths, width), len(widths) - 1)
+        candidates = by_width[index]
+        for name in list(VARIANT_FORMATS) + list(FALLBACK_FORMATS):
+            asset = candidates.get(name)
+            if asset is not None and (name in FALLBACK_FORMATS or asset.content_type in accepted_types):
+                return asset
+        return None
+
+    @staticmethod
+    def _images(manifest):
+        return [asset for asset in manifest if asset.path.lower().endswith(IMAGE_EXTENSIONS)]
+
+    def _directory(self, asset):
+        return os.path.join(self.cache_dir, hashlib.sha256(asset.body).hexdigest()[:16])
+
+    def _index(self, asset):
+        """([larguras], [{formato: StaticAsset}]) dos arquivos já gerados, ou None"""
+        directory = self._directory(asset)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return None
+        extensions = {
+            extension: (name, content_type)
+            for name, (extension, content_type, _) in {**VARIANT_FORMATS, **FALLBACK_FORMATS}.items()
+        }
+        by_width = {}
+        for file_name in names:
+            width, _, extension = file_name.partition('.')
+            if not width.isdigit() or extension not in extensions:
+                continue
+            name, content_type = extensions[extension]
+            with open(os.path.join(directory, file_name), 'rb') as file:
+                body = file.read()
+            by_width.setdefault(int(width), {})[name] = StaticAsset(asset.path, asset.url_path, content_type, body)
+        # Só larguras com o formato de fallback completo podem ser servidas a qualquer cliente
+        widths = sorted(w for w, encoded in by_width.items() if set(encoded) & set(FALLBACK_FORMATS))
+        if not widths:
+            return None
+        return widths, [by_width[w] for w in widths]
+
+    def _build_image(self, asset, formats):
+        directory = self._directory(asset)
+        os.makedirs(directory, exist_ok=True)
+        lock_path = os.path.join(directory, '.lock')
+        self._acquire(lock_path)
+        try:
+            with Image.open(io.BytesIO(asset.body)) as source:
+                source.load()
+                fallback = 'png' if source.format == 'PNG' else 'jpeg'
+                widths = [w for w in self.widths if w < source.width] + [source.width]
+                for width in widths:
+                    # Fallback por último: sua presença marca a largura como completa
+                    for name in formats + [fallback]:
+                        extension, _, options = VARIANT_FORMATS.get(name) or FALLBACK_FORMATS[name]
+                        file_path = os.path.join(directory, f'{width}.{extension}')
+                        if not os.path.exists(file_path):
+                            self._write_variant(source, width, name, options, file_path)
+        finally:
+            os.remove(lock_path)
+
+    @staticmethod
+    def _acquire(lock_path):
+        """Criar o lock da imagem, esperando se outro processo a estiver gerando
+
+        Quem esperou encontra os arquivos prontos e não codifica nada.
+        """
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                pass
+            try:
+                stale = time.time() - os.path.getmtime(lock_path) > BUILD_LOCK_TIMEOUT
+                if stale:
+                    os.remove(lock_path)
+            except OSError:
+                continue  # liberado entre as chamadas
+            if not stale:
+                time.sleep(0.5)
+
+    @staticmethod
+    def _write_variant(source, width, name, options, file_path):
+        height = max(1, round(source.height * width / source.width))
+        image = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        if name == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif name != 'jpeg' and image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+        # Grava em arquivo temporário para que outro worker nunca leia pela metade
+        temporary_path = f'{file_path}.{os.getpid()}.tmp'
+        image.save(temporary_path, format=name.upper(), **options)
+        os.replace(temporary_path, file_path)
+
+
+def requested_width(args):
+    """Largura pedida em ?w= ou ?icon=, ou None"""
+    if 'icon' in args:
+        return ICON_SIZES.get(args['icon'])
+    return args.get('w', type=int)
+
@@ -3,75 +3,396 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+import importlib
+import threading
+import time
+from flask import Flask, request
 from flask_cors import CORS
+from sqlalchemy import event
 from src.models.user import db
-from src.routes.user import user_bp
-from src.routes.auth import auth_bp
-from src.routes.courses import courses_bp
-from src.routes.scheduling import scheduling_bp
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asteca_seguranca_2025_secret_key'
-
-# Habilitar CORS para todas as rotas
-CORS(app)
-
-# Registrar blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(courses_bp, url_prefix='/api/courses')
-app.register_blueprint(scheduling_bp, url_prefix='/api/scheduling')
-
-# Configuração do banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-with app.app_context():
-    db.create_all()
-
-# Rota para informações da API
-@app.route('/api/info', methods=['GET'])
-def api_info():
-    return {
-        'name': 'Asteca Segurança API',
-        'version': '1.0.0',
-        'description': 'API para portal de cursos de segurança do trabalho',
-        'endpoints': {
-            'auth': '/api/auth/*',
-            'courses': '/api/courses/*',
-            'scheduling': '/api/scheduling/*',
-            'users': '/api/*'
-        },
-        'contact': {
-            'whatsapp': '(47) 99695-0869',
-            'email': 'vanessa.asteca@gmail.com',
-            'instagram': '@astecasegurancadotrabalho'
+
+BASE_DIR = os.path.dirname(__file__)
+
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'asteca_seguranca_2025_secret_key',
+
+    # Fator de trabalho do hash de senhas e tamanho do pool de hashing
+    # (hashes com outro método são refeitos no próximo login)
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:600000',
+    'PASSWORD_HASH_WORKERS': os.cpu_count() or 2,
+
+    # Configuração do banco de dados
+    'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(BASE_DIR, 'database', 'app.db')}",
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    # Pool de conexões compartilhado pelas threads do worker; o timeout do
+    # sqlite3 espera o lock de escrita em vez de falhar durante picos de reservas
+    'SQLALCHEMY_ENGINE_OPTIONS': {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_pre_ping': True,
+        'connect_args': {'timeout': 15, 'check_same_thread': False}
+    },
+
+    # Compactação dos agendamentos: provas canceladas e as passadas há mais
+    # de EXAM_ARCHIVE_AFTER_DAYS dias vão para o arquivo a cada intervalo (s)
+    'EXAM_COMPACTION_ENABLED': True,
+    'EXAM_COMPACTION_INTERVAL': 3600.0,
+    'EXAM_ARCHIVE_AFTER_DAYS': 7,
+
+    # Emails com acesso às rotas administrativas (exportações, agendamento de equipes)
+    'ADMIN_EMAILS': [],
+
+    # Cache em memória dos perfis lidos do banco: quantidade e validade (s)
+    'USER_CACHE_SIZE': 2048,
+    'USER_CACHE_TTL': 10.0,
+
+    # Estado compartilhado dos blueprints (rankings, progresso, badges):
+    # 'memory' para um único processo ou 'sqlite' para vários workers
+    'STATE_BACKEND': 'memory',
+    'STATE_SQLITE_PATH': os.path.join(BASE_DIR, 'database', 'state.db'),
+    # Intervalo (s) entre verificações de mudanças feitas por outros workers
+    'STATE_REFRESH_INTERVAL': 0.5,
+
+    # Criação das tabelas: 'first_request' (padrão), 'startup' ou 'never'
+    # (nesse caso use `flask --app main:create_app init-db` no deploy)
+    'CREATE_SCHEMA': 'first_request',
+    # Importar e registrar os blueprints só no primeiro request do worker
+    'LAZY_BLUEPRINTS': False,
+
+    # Notificações (confirmação de agendamento etc.) enviadas por uma thread
+    # a partir do outbox no banco: 'log' (simulado), 'memory' ou um objeto com send()
+    'NOTIFICATIONS_ENABLED': True,
+    'NOTIFICATION_SENDER': 'log',
+    'NOTIFICATION_BATCH_SIZE': 50,
+    'NOTIFICATION_POLL_INTERVAL': 1.0,
+    'NOTIFICATION_RATE_LIMIT': 5,  # envios por segundo por processo
+    'NOTIFICATION_MAX_ATTEMPTS': 8,
+    # Dias que as mensagens já enviadas ficam no outbox antes de serem apagadas
+    'NOTIFICATION_RETENTION_DAYS': 7,
+
+    # Pasta de cache das variantes de imagem (padrão: <static>/.derivatives)
+    'IMAGE_VARIANTS_CACHE_DIR': None,
+    # Geração das variantes que faltam: 'background' (thread após o primeiro
+    # request) ou 'never' (use `flask --app main:create_app build-image-variants` no deploy)
+    'IMAGE_VARIANTS_BUILD': 'background',
+
+    # Profiler por amostragem para requests acima deste tempo (None = desligado)
+    'METRICS_SLOW_REQUEST_MS': None,
+    'METRICS_PROFILE_INTERVAL_MS': 5
+}
+
+# (módulo, atributo, prefixo de URL) de cada blueprint
+BLUEPRINTS = [
+    ('src.routes.user', 'user_bp', '/api'),
+    ('src.routes.auth', 'auth_bp', '/api/auth'),
+    ('src.routes.courses', 'courses_bp', '/api/courses'),
+    ('src.routes.scheduling', 'scheduling_bp', '/api/scheduling'),
+    ('src.routes.exports', 'exports_bp', '/api/admin/exports'),
+]
+
+
+class StartupReport:
+    """Tempo gasto em cada etapa da inicialização (imports, schema, estáticos)"""
+
+    def __init__(self):
+        self.steps = []
+
+    def measure(self, name, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self.steps.append((name, time.perf_counter() - started))
+        return result
+
+    def as_dict(self):
+        return {
+            'steps': [{'step': name, 'ms': round(seconds * 1000, 2)} for name, seconds in self.steps],
+            'total_ms': round(sum(seconds for _, seconds in self.steps) * 1000, 2)
         }
-    }
-
-# Rota de health check
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return {'status': 'healthy', 'service': 'Asteca Segurança Portal'}
-
-# Servir arquivos estáticos e SPA
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
+
+
+class DeferredInit:
+    """Executa tarefas de inicialização antes do primeiro request do worker
+
+    Envolve app.wsgi_app, então as tarefas rodam antes de o Flask marcar o
+    primeiro request (ainda é permitido registrar blueprints nesse ponto).
+    """
+
+    def __init__(self, wsgi_app, tasks):
+        self.wsgi_app = wsgi_app
+        self.tasks = tasks
+        self.done = not tasks
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        if not self.done:
+            with self._lock:
+                if not self.done:
+                    for task in self.tasks:
+                        task()
+                    self.done = True
+        return self.wsgi_app(environ, start_response)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Ativar WAL para que leituras não bloqueiem a escrita entre workers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=15000')
+    cursor.close()
+
+
+def register_blueprints(app):
+    report = app.extensions['startup_report']
+    for module_name, attribute, url_prefix in BLUEPRINTS:
+        module = report.measure(f'import {module_name}', importlib.import_module, module_name)
+        app.register_blueprint(getattr(module, attribute), url_prefix=url_prefix)
+
+
+def create_schema(app):
+    """Criar tabelas e dados de demonstração"""
+    # Importar os módulos registra os modelos Exam, UserAccount, Team, ProgressEvent e
+    # ProgressAggregate no metadata
+    from src.routes.scheduling import EXAM_STORE, SCHEDULED_EXAMS
+    from src.routes.progress import ProgressEvent, ProgressAggregate
+    from src.routes.auth import SEED_USERS
+    from src.routes.courses import TEAM_RANKING, seed_user_ranking
+    from src.routes.user_directory import USER_DIRECTORY
+    with app.app_context():
+        db.create_all()
+        EXAM_STORE.upgrade_schema()
+        EXAM_STORE.seed(SCHEDULED_EXAMS)
+        USER_DIRECTORY.add_teams(team['name'] for team in TEAM_RANKING)
+        USER_DIRECTORY.seed(SEED_USERS)
+        seed_user_ranking(SEED_USERS)
+
+
+def create_app(config=None):
+    """Criar e configurar a aplicação"""
+    report = StartupReport()
+    app = Flask(__name__, static_folder=os.path.join(BASE_DIR, 'static'))
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    app.extensions['startup_report'] = report
+
+    from src.routes.auth_middleware import TOKEN_CACHE
+    from src.routes.passwords import PASSWORD_HASHER
+    from src.routes.static_assets import StaticManifest
+    from src.routes.image_variants import ImageVariants, requested_width
+    from src.routes.metrics import METRICS
+    from src.routes.state import STATE, create_backend
+    from src.routes.notifications import OutboxWorker, create_sender
+    from src.routes.user_directory import USER_DIRECTORY
+
+    STATE.configure(create_backend(app.config), app.config['STATE_REFRESH_INTERVAL'])
+
+    USER_DIRECTORY.configure(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+    PASSWORD_HASHER.configure(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS']
+    )
+
+    # Habilitar CORS para todas as rotas
+    CORS(app)
+
+    # Histogramas de latência, status e tamanho por rota em /api/metrics
+    METRICS.init_app(app)
+    METRICS.add_collector('token_cache', lambda: [
+        '# TYPE asteca_token_cache_hits_total counter',
+        f"asteca_token_cache_hits_total {TOKEN_CACHE.hits}",
+        '# TYPE asteca_token_cache_misses_total counter',
+        f"asteca_token_cache_misses_total {TOKEN_CACHE.misses}"
+    ])
+    METRICS.add_collector('user_cache', lambda: [
+        '# TYPE asteca_user_cache_hits_total counter',
+        f"asteca_user_cache_hits_total {USER_DIRECTORY.cache.hits}",
+        '# TYPE asteca_user_cache_misses_total counter',
+        f"asteca_user_cache_misses_total {USER_DIRECTORY.cache.misses}"
+    ])
+
+    db.init_app(app)
+    with app.app_context():
+        if db.engine.url.get_backend_name() == 'sqlite':
+            event.listen(db.engine, 'connect', set_sqlite_pragmas)
+
+    # Registrar blueprints (agora ou no primeiro request) e criar o schema
+    deferred = []
+    if app.config['LAZY_BLUEPRINTS']:
+        deferred.append(lambda: register_blueprints(app))
     else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+        register_blueprints(app)
 
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if app.config['CREATE_SCHEMA'] == 'startup':
+        report.measure('create schema', create_schema, app)
+    elif app.config['CREATE_SCHEMA'] == 'first_request':
+        deferred.append(lambda: report.measure('create schema', create_schema, app))
+
+    # Envio das notificações em segundo plano; a thread é iniciada no
+    # primeiro request para existir em cada processo de um servidor pre-fork
+    if app.config['NOTIFICATIONS_ENABLED']:
+        outbox_worker = OutboxWorker(
+            app,
+            create_sender(app.config, app.logger),
+            batch_size=app.config['NOTIFICATION_BATCH_SIZE'],
+            poll_interval=app.config['NOTIFICATION_POLL_INTERVAL'],
+            rate_limit=app.config['NOTIFICATION_RATE_LIMIT'],
+            max_attempts=app.config['NOTIFICATION_MAX_ATTEMPTS'],
+            retention=app.config['NOTIFICATION_RETENTION_DAYS'] * 86400.0
+        )
+        app.extensions['outbox_worker'] = outbox_worker
+        deferred.append(outbox_worker.start)
+        METRICS.add_collector('notifications', lambda: [
+            '# TYPE asteca_notifications_sent_total counter',
+            f"asteca_notifications_sent_total {outbox_worker.sent}",
+            '# TYPE asteca_notifications_retried_total counter',
+            f"asteca_notifications_retried_total {outbox_worker.retried}",
+            '# TYPE asteca_notifications_failed_total counter',
+            f"asteca_notifications_failed_total {outbox_worker.failed}"
+        ])
+
+    # Compactação periódica dos agendamentos, iniciada junto com o blueprint
+    # de agendamento (o import fica para o primeiro request com LAZY_BLUEPRINTS)
+    def start_exam_compaction():
+        from src.routes.exam_store import ExamCompactor
+        from src.routes.scheduling import EXAM_STORE
+        compactor = ExamCompactor(
+            app, EXAM_STORE,
+            interval=app.config['EXAM_COMPACTION_INTERVAL'],
+            archive_after_days=app.config['EXAM_ARCHIVE_AFTER_DAYS']
+        )
+        app.extensions['exam_compactor'] = compactor
+        compactor.start()
+
+    if app.config['EXAM_COMPACTION_ENABLED']:
+        deferred.append(start_exam_compaction)
+
+    # Manifesto dos arquivos estáticos (conteúdo, fingerprints e variantes
+    # gzip/brotli em memória), montado uma vez na inicialização
+    static_manifest = report.measure('static manifest', StaticManifest, app.static_folder)
+
+    # Variantes redimensionadas (WebP/AVIF + original) das imagens, em cache no
+    # disco por hash da imagem de origem; servidas com ?w=<largura> ou ?icon=sm|md|lg.
+    # Na inicialização só as já geradas são indexadas; as que faltam são
+    # codificadas fora dela e, até lá, a imagem original é servida
+    image_variants = ImageVariants(
+        app.config['IMAGE_VARIANTS_CACHE_DIR'] or os.path.join(app.static_folder, '.derivatives')
+    )
+    report.measure('image variants', image_variants.load, static_manifest)
+    if app.config['IMAGE_VARIANTS_BUILD'] == 'background':
+        deferred.append(lambda: image_variants.start_build(static_manifest, app.logger))
+
+    @app.cli.command('build-image-variants')
+    def build_image_variants_command():
+        """Gerar as variantes de imagem que faltam no cache em disco"""
+        image_variants.build(static_manifest)
+        print(f'Variantes de {len(image_variants)} imagens prontas')
+
+    app.wsgi_app = DeferredInit(app.wsgi_app, deferred)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Criar tabelas e dados de demonstração"""
+        create_schema(app)
+        print('Banco de dados inicializado')
+
+    @app.cli.command('compact-exams')
+    def compact_exams_command():
+        """Mover agendamentos passados e cancelados para o arquivo"""
+        from src.routes.scheduling import EXAM_STORE
+        with app.app_context():
+            moved = EXAM_STORE.compact(archive_after_days=app.config['EXAM_ARCHIVE_AFTER_DAYS'])
+        print(f'{moved} agendamentos arquivados')
 
+    @app.cli.command('startup-report')
+    def startup_report_command():
+        """Mostrar o tempo de cada etapa da inicialização"""
+        for step in report.as_dict()['steps']:
+            print(f"{step['ms']:>10.2f} ms  {step['step']}")
+
+    # Rota para informações da API
+    @app.route('/api/info', methods=['GET'])
+    def api_info():
+        return {
+            'name': 'Asteca Segurança API',
+            'version': '1.0.0',
+            'description': 'API para portal de cursos de segurança do trabalho',
+            'endpoints': {
+                'auth': '/api/auth/*',
+                'courses': '/api/courses/*',
+                'scheduling': '/api/scheduling/*',
+                'exports': '/api/admin/exports/*',
+                'users': '/api/*'
+            },
+            'contact': {
+                'whatsapp': '(47) 99695-0869',
+                'email': 'vanessa.asteca@gmail.com',
+                'instagram': '@astecasegurancadotrabalho'
+            }
+        }
+
+    # Rota de health check
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        return {
+            'status': 'healthy',
+            'service': 'Asteca Segurança Portal',
+            'token_cache': TOKEN_CACHE.stats(),
+            'user_cache': USER_DIRECTORY.cache.stats(),
+            'state_backend': app.config['STATE_BACKEND'],
+            'notifications': app.extensions['outbox_worker'].stats() if 'outbox_worker' in app.extensions else None,
+            'exam_compaction': app.extensions['exam_compactor'].stats() if 'exam_compactor' in app.extensions else None,
+            'startup': report.as_dict()
+        }
+
+    # Servir arquivos estáticos e SPA
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+            return "Static folder not configured", 404
+
+        asset, immutable = static_manifest.lookup(path) if path != "" else (None, False)
+        if asset is None:
+            asset, immutable = static_manifest.lookup('index.html')
+            if asset is None:
+                return "index.html not found", 404
+
+        width = requested_width(request.args)
+        if width and image_variants.has_variants(asset.path):
+            accepted_types = {value for value, _ in request.accept_mimetypes}
+            variant = image_variants.select(asset.path, width, accepted_types)
+            if variant is not None:
+                response = static_manifest.response(variant, immutable)
+                response.vary.add('Accept')
+                return response
+        elif width and asset.content_type.startswith('image/'):
+            # Variantes ainda não geradas (ou Pillow ausente): o original vai
+            # com revalidação, para o navegador não guardá-lo no lugar da variante
+            return static_manifest.response(asset, immutable=False)
+
+        return static_manifest.response(asset, immutable)
+
+    app.logger.debug('Inicialização: %s', report.as_dict())
+    return app
+
+
+_app = None
+_app_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # `main.app` continua funcionando (ex.: gunicorn main:app), mas a
+    # aplicação só é criada quando alguém a usa, não no import do módulo
+    global _app
+    if name != 'app':
+        raise AttributeError(name)
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
+
+
+if __name__ == '__main__':
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,211 @@
+from collections import Counter, deque
+from flask import g, request
+import bisect
+import sys
+import threading
+import time
+
+# Limites dos buckets (segundos e bytes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Histograma cumulativo por conjunto de labels, no formato do Prometheus"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # labels -> [contagem por bucket..., +Inf], soma
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, label_names):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(self._series.items()):
+            base = format_labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {total}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+
+
+class SlowRequestProfiler:
+    """Profiler por amostragem, ligado só por configuração
+
+    Uma thread amostra periodicamente a pilha das threads que estão
+    atendendo requests; quando um request passa do limite, as pilhas mais
+    frequentes são registradas no log e guardadas em recent.
+    """
+
+    def __init__(self, logger, threshold_ms, interval_ms=5, max_depth=20, keep=50):
+        self.logger = logger
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.max_depth = max_depth
+        self.recent = deque(maxlen=keep)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_request(self):
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+
+    def finish_request(self, endpoint, elapsed):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples is None or elapsed < self.threshold:
+            return
+        report = {
+            'endpoint': endpoint,
+            'ms': round(elapsed * 1000, 2),
+            'samples': sum(samples.values()),
+            'top_stacks': [{'count': count, 'stack': list(stack)} for stack, count in samples.most_common(5)]
+        }
+        self.recent.append(report)
+        self.logger.warning('Request lento em %s (%.1f ms): %s', endpoint, report['ms'], report['top_stacks'][:1])
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._stack(frame)] += 1
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f'{code.co_filename}:{frame.f_lineno} {code.co_name}')
+            frame = frame.f_back
+        return tuple(stack)
+
+
+class Metrics:
+    """Latência, status, requests em andamento e tamanho das respostas por rota
+
+    Cobre todas as rotas de blueprints (auth, courses, scheduling, user).
+    Os números são por processo; com vários workers, o Prometheus agrega.
+    """
+
+    LABELS = ('blueprint', 'endpoint', 'method')
+
+    def __init__(self):
+        self.latency = Histogram('asteca_http_request_duration_seconds', 'Latência dos requests', LATENCY_BUCKETS)
+        self.response_size = Histogram('asteca_http_response_size_bytes', 'Tamanho das respostas', SIZE_BUCKETS)
+        self.status_counts = Counter()
+        self.in_flight = Counter()
+        self.profiler = None
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        slow_request_ms = app.config.get('METRICS_SLOW_REQUEST_MS')
+        if slow_request_ms:
+            self.profiler = SlowRequestProfiler(
+                app.logger, slow_request_ms, app.config.get('METRICS_PROFILE_INTERVAL_MS', 5)
+            )
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/api/metrics', 'metrics', self.metrics_view, methods=['GET'])
+        if self.profiler:
+            app.add_url_rule('/api/metrics/slow-requests', 'slow_requests', self.slow_requests_view, methods=['GET'])
+
+    def add_collector(self, name, collector):
+        """Registrar função que retorna linhas extras no formato do Prometheus"""
+        self._collectors[name] = collector
+
+    def _labels(self):
+        return (request.blueprint, request.endpoint, request.method)
+
+    def _before_request(self):
+        if request.blueprint is None:
+            return
+        g.metrics_started = time.perf_counter()
+        with self._lock:
+            self.in_flight[request.blueprint] += 1
+        if self.profiler:
+            self.profiler.start_request()
+
+    def _after_request(self, response):
+        if 'metrics_started' in g:
+            size = response.calculate_content_length()
+            with self._lock:
+                self.status_counts[self._labels() + (response.status_code,)] += 1
+                if size is not None:
+                    self.response_size.observe(self._labels(), size)
+        return response
+
+    def _teardown_request(self, exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latency.observe(self._labels(), elapsed)
+            self.in_flight[request.blueprint] -= 1
+        if self.profiler:
+            self.profiler.finish_request(request.endpoint, elapsed)
+
+    def render(self):
+        """Métricas no formato texto do Prometheus"""
+        with self._lock:
+            lines = self.latency.render(self.LABELS)
+            lines += [
+                '# HELP asteca_http_requests_total Requests por rota e status',
+                '# TYPE asteca_http_requests_total counter'
+            ]
+            for labels, count in sorted(self.status_counts.items()):
+                lines.append(f'asteca_http_requests_total{{{format_labels(self.LABELS + ("status",), labels)}}} {count}')
+            lines += [
+                '# HELP asteca_http_requests_in_flight Requests em andamento por blueprint',
+                '# TYPE asteca_http_requests_in_flight gauge'
+            ]
+            for blueprint, count in sorted(self.in_flight.items()):
+                lines.append(f'asteca_http_requests_in_flight{{{format_labels(("blueprint",), (blueprint,))}}} {count}')
+            lines += self.response_size.render(self.LABELS)
+        for collector in self._collectors.values():
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        """Expor métricas para o Prometheus"""
+        return self.render(), 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}
+
+    def slow_requests_view(self):
+        """Últimos requests lentos com as pilhas amostradas"""
+        return {'success': True, 'slow_requests': list(self.profiler.recent)}
+
+
+METRICS = Metrics()
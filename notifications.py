@@ -0,0 +1,255 @@
+import datetime
+import json
+import random
+import threading
+import time
+import uuid
+from sqlalchemy.exc import OperationalError
+from src.models.user import db
+
+# Mensagens enviadas ao aluno para cada evento do agendamento
+MESSAGE_TEMPLATES = {
+    'exam_booked': 'Olá! Sua prova de {course_name} foi agendada para {date} às {time}. Confirmaremos em breve!',
+    'exam_rescheduled': 'Olá! Sua prova de {course_name} foi reagendada para {date} às {time}. Confirmaremos em breve!',
+    'exam_cancelled': 'Olá! Sua prova de {course_name} de {date} às {time} foi cancelada.',
+}
+
+
+class OutboxMessage(db.Model):
+    """Notificação pendente de envio, gravada na transação do agendamento"""
+    __tablename__ = 'notification_outbox'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event = db.Column(db.String(40), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # Momento (epoch) a partir do qual a mensagem pode ser enviada/reenviada
+    next_attempt_at = db.Column(db.Float, nullable=False)
+    claim_token = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.String(32), nullable=False)
+    sent_at = db.Column(db.String(32))
+
+    __table_args__ = (
+        db.Index('ix_notification_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event': self.event,
+            'recipient': self.recipient,
+            'payload': json.loads(self.payload),
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'created_at': self.created_at,
+            'sent_at': self.sent_at
+        }
+
+
+def render_message(event, payload):
+    """Texto da notificação de um evento"""
+    return MESSAGE_TEMPLATES[event].format(**payload)
+
+
+class NotificationOutbox:
+    """Gravação de notificações junto com a alteração que as originou"""
+
+    def add(self, event, exam):
+        """Adicionar notificação à sessão atual (gravada no mesmo commit)"""
+        if event not in MESSAGE_TEMPLATES:
+            return
+        db.session.add(OutboxMessage(
+            event=event,
+            recipient=exam['user_email'],
+            payload=json.dumps(exam),
+            next_attempt_at=time.time(),
+            created_at=datetime.datetime.now().isoformat()
+        ))
+
+
+class LogSender:
+    """Envio simulado: registra a mensagem no log da aplicação"""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def send(self, recipient, message, payload):
+        self.logger.info('Notificação para %s: %s', recipient, message)
+
+
+class MemorySender:
+    """Envio simulado que guarda as mensagens em memória (testes)"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, recipient, message, payload):
+        self.sent.append((recipient, message, payload))
+
+
+class RateLimiter:
+    """Balde de fichas: até rate envios por segundo, com rajadas de até burst"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def acquire(self):
+        """Esperar até haver uma ficha"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            time.sleep((1 - self._tokens) / self.rate)
+
+
+class OutboxWorker:
+    """Thread que esvazia o outbox em lotes, fora do caminho dos requests
+
+    Cada lote é reservado com um token e um prazo (lease): outros workers
+    não pegam as mesmas mensagens, e se o processo morrer no meio do envio
+    elas voltam a ficar disponíveis quando o prazo vence. Falhas são
+    reenviadas com backoff exponencial (com jitter) até max_attempts.
+    Mensagens enviadas há mais de retention segundos são apagadas a cada
+    purge_interval segundos, para a tabela não crescer indefinidamente.
+    """
+
+    def __init__(self, app, sender, batch_size=50, poll_interval=1.0, rate_limit=5,
+                 max_attempts=8, backoff_base=2.0, backoff_max=600.0, lease=60.0,
+                 retention=7 * 86400.0, purge_interval=3600.0):
+        self.app = app
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.purged = 0
+        self._purged_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='notification-outbox', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {'sent': self.sent, 'retried': self.retried, 'failed': self.failed, 'purged': self.purged}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.drain_once()
+                    if time.monotonic() - self._purged_at >= self.purge_interval:
+                        self.purge_sent()
+                        self._purged_at = time.monotonic()
+            except OperationalError:
+                # Tabela ainda não criada (schema no primeiro request) ou banco ocupado
+                processed = 0
+            except Exception:
+                self.app.logger.exception('Falha ao processar o outbox de notificações')
+                processed = 0
+            if processed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def drain_once(self):
+        """Reservar e enviar um lote; retorna quantas mensagens foram processadas"""
+        messages = self._claim_batch()
+        for message in messages:
+            self.rate_limiter.acquire()
+            payload = json.loads(message.payload)
+            try:
+                self.sender.send(message.recipient, render_message(message.event, payload), payload)
+            except Exception as error:
+                self._record_failure(message, error)
+            else:
+                message.status = 'sent'
+                message.sent_at = datetime.datetime.now().isoformat()
+                self.sent += 1
+            message.attempts += 1
+            message.claim_token = None
+            db.session.commit()
+        return len(messages)
+
+    def purge_sent(self):
+        """Apagar mensagens enviadas há mais de retention segundos; retorna quantas"""
+        cutoff = (datetime.datetime.now() - datetime.timedelta(seconds=self.retention)).isoformat()
+        deleted = (
+            OutboxMessage.query
+            .filter(OutboxMessage.status == 'sent', OutboxMessage.sent_at < cutoff)
+            .delete(synchronize_session=False)
+        )
+        db.session.commit()
+        self.purged += deleted
+        return deleted
+
+    def _claim_batch(self):
+        now = time.time()
+        token = uuid.uuid4().hex
+        due = (
+            db.session.query(OutboxMessage.id)
+            .filter(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now)
+            .order_by(OutboxMessage.next_attempt_at)
+            .limit(self.batch_size)
+        )
+        # A condição de vencimento é reavaliada no UPDATE: se outro worker
+        # reservou a mensagem antes, o prazo já foi adiado e ela fica de fora
+        (
+            OutboxMessage.query
+            .filter(
+                OutboxMessage.id.in_(due.scalar_subquery()),
+                OutboxMessage.status == 'pending',
+                OutboxMessage.next_attempt_at <= now
+            )
+            .update({'claim_token': token, 'next_attempt_at': now + self.lease}, synchronize_session=False)
+        )
+        db.session.commit()
+        return OutboxMessage.query.filter_by(claim_token=token).order_by(OutboxMessage.id).all()
+
+    def _record_failure(self, message, error):
+        message.last_error = f'{type(error).__name__}: {error}'
+        if message.attempts + 1 >= self.max_attempts:
+            message.status = 'failed'
+            self.failed += 1
+            self.app.logger.error('Notificação %s descartada após %s tentativas: %s',
+                                  message.id, message.attempts + 1, message.last_error)
+            return
+        delay = min(self.backoff_max, self.backoff_base ** (message.attempts + 1))
+        message.next_attempt_at = time.time() + delay * random.uniform(0.5, 1.0)
+        self.retried += 1
+
+
+def create_sender(config, logger):
+    """Sender conforme NOTIFICATION_SENDER: 'log', 'memory' ou um objeto com send()"""
+    sender = config.get('NOTIFICATION_SENDER', 'log')
+    if sender == 'log':
+        return LogSender(logger)
+    if sender == 'memory':
+        return MemorySender()
+    return sender
+
+
+NOTIFICATION_OUTBOX = NotificationOutbox()
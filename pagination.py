@@ -0,0 +1,85 @@
+import base64
+import json
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidPageRequest(ValueError):
+    """Cursor, limit ou fields inválidos"""
+
+
+def encode_cursor(position):
+    """Cursor opaco para o cliente a partir da posição (dict JSON)"""
+    raw = json.dumps(position, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except ValueError:
+        raise InvalidPageRequest('cursor inválido')
+    if not isinstance(position, dict):
+        raise InvalidPageRequest('cursor inválido')
+    return position
+
+
+class PageRequest:
+    """Parâmetros ?limit=, ?cursor= e ?fields= de uma listagem
+
+    Sem limit nem cursor a listagem segue completa, como antes (a menos
+    que always_paginate seja True); fields limita os campos de cada item
+    aos pedidos.
+    """
+
+    def __init__(self, args, allowed_fields, default_limit=20, max_limit=MAX_PAGE_SIZE, always_paginate=False):
+        self.paginated = always_paginate or 'limit' in args or 'cursor' in args
+        try:
+            limit = int(args.get('limit', default_limit))
+        except ValueError:
+            raise InvalidPageRequest('limit deve ser um número')
+        self.limit = min(max(limit, 1), max_limit)
+        self.cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+
+        self.fields = None
+        if args.get('fields'):
+            fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+            unknown = [field for field in fields if field not in allowed_fields]
+            if unknown:
+                raise InvalidPageRequest(f"Campos desconhecidos: {', '.join(unknown)}")
+            self.fields = tuple(dict.fromkeys(fields))
+
+    def cursor_value(self, **fields):
+        """Valores do cursor recebido na ordem de fields (nome=tipo); None sem cursor"""
+        if self.cursor is None:
+            return None
+        values = tuple(self.cursor.get(name) for name in fields)
+        if not all(isinstance(value, kind) for value, kind in zip(values, fields.values())):
+            raise InvalidPageRequest('cursor inválido')
+        return values
+
+    def split(self, items, position):
+        """(itens da página, próximo cursor) a partir de até limit + 1 itens
+
+        As listagens pedem um item a mais ao store: se ele vier, há próxima
+        página e o cursor aponta para o último item desta (position(item)).
+        """
+        items = list(items)
+        if not self.paginated or len(items) <= self.limit:
+            return items, None
+        items = items[:self.limit]
+        return items, encode_cursor(position(items[-1]))
+
+    @property
+    def cache_key(self):
+        """Parte da chave do cache de respostas que identifica a página"""
+        cursor = encode_cursor(self.cursor) if self.cursor else ''
+        fields = ','.join(sorted(self.fields)) if self.fields else ''
+        return f"{self.limit if self.paginated else 'all'}:{cursor}:{fields}"
+
+    def project(self, items):
+        """Itens só com os campos pedidos"""
+        if self.fields is None:
+            return list(items)
+        return [{field: item[field] for field in self.fields if field in item} for item in items]
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+import os
+import threading
+
+# Método padrão do werkzeug; o número de iterações é o fator de trabalho
+DEFAULT_HASH_METHOD = 'pbkdf2:sha256:600000'
+# Quanto tempo um pedido espera por uma vaga no pool antes de desistir
+DEFAULT_QUEUE_TIMEOUT = 5
+
+
+def method_prefix(method):
+    """Prefixo dos hashes gerados com method
+
+    O werkzeug completa os parâmetros omitidos ('scrypt' vira
+    'scrypt:32768:8:1', 'pbkdf2' vira 'pbkdf2:sha256:<iterações>'), então o
+    prefixo vem de um hash gerado de verdade, não da configuração.
+    """
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+class PasswordHasherBusy(Exception):
+    """Pool de hashing saturado"""
+
+
+class PasswordHasher:
+    """Geração e verificação de hashes de senha em um pool limitado de threads
+
+    O hashlib libera o GIL durante o PBKDF2/scrypt, então as threads do pool
+    usam núcleos de verdade. A thread da requisição continua bloqueada
+    esperando o resultado (hash() e verify() são síncronos): o pool limita
+    quantos hashes rodam ao mesmo tempo e recusa o excesso com
+    PasswordHasherBusy, mas não libera o worker durante a espera. O número de
+    tarefas em andamento ou na fila é limitado para que um pico de logins
+    não acumule trabalho sem fim.
+    """
+
+    def __init__(self, method=DEFAULT_HASH_METHOD, workers=None, queue_size=None,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.method = method
+        self.workers = workers or os.cpu_count() or 2
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(queue_size or self.workers * 4)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        # Future com method_prefix(self.method), criada em configure() ou no primeiro uso
+        self._method_prefix = None
+
+    def configure(self, method=None, workers=None):
+        """Alterar método/fator de trabalho e tamanho do pool"""
+        if method:
+            self.method = method
+        if workers and workers != self.workers:
+            old_executor = self._executor
+            self.workers = workers
+            self._slots = threading.BoundedSemaphore(workers * 4)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            old_executor.shutdown(wait=False)
+        if method:
+            # Calculado uma vez, no pool, sem atrasar a inicialização
+            self._method_prefix = self._executor.submit(method_prefix, self.method)
+
+    def submit(self, fn, *args):
+        """Enfileirar uma tarefa no pool; levanta PasswordHasherBusy se saturado"""
+        slots = self._slots
+        if not slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy()
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def hash(self, password):
+        """Gerar hash com o método configurado"""
+        return self.submit(generate_password_hash, password, self.method).result()
+
+    def verify(self, password_hash, password):
+        """Verificar senha contra o hash"""
+        return self.submit(check_password_hash, password_hash, password).result()
+
+    def needs_rehash(self, password_hash):
+        """Hash gerado com método ou fator de trabalho diferente do atual"""
+        if self._method_prefix is None:
+            self._method_prefix = self._executor.submit(method_prefix, self.method)
+        return password_hash.split('$', 1)[0] != self._method_prefix.result()
+
+    def rehash_later(self, password, on_done):
+        """Gerar novo hash em segundo plano e entregar a on_done(hash)"""
+        try:
+            future = self.submit(generate_password_hash, password, self.method)
+        except PasswordHasherBusy:
+            return  # Tenta de novo no próximo login
+        future.add_done_callback(lambda f: f.exception() is None and on_done(f.result()))
+
+
+PASSWORD_HASHER = PasswordHasher()
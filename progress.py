@@ -0,0 +1,253 @@
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+import copy
+import datetime
+import json
+
+# Pontos por módulo concluído e pontos necessários por nível
+POINTS_PER_MODULE = 10
+POINTS_PER_LEVEL = 100
+
+# Novas tentativas quando outro pedido grava o progresso do mesmo usuário ao mesmo tempo
+WRITE_ATTEMPTS = 3
+
+
+def level_for(points):
+    """Nível correspondente à pontuação"""
+    return points // POINTS_PER_LEVEL + 1
+
+
+class ProgressEvent(db.Model):
+    """Conclusão de módulo no log de eventos (só inserções; id é a sequência)"""
+    __tablename__ = 'progress_events'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    type = db.Column(db.String(40), nullable=False, default='module_completed')
+    user_email = db.Column(db.String(120), nullable=False)
+    course_id = db.Column(db.String(50), nullable=False)
+    module_id = db.Column(db.Integer, nullable=False)
+    points = db.Column(db.Integer, nullable=False)
+    course_completed = db.Column(db.Boolean, nullable=False, default=False)
+    timestamp = db.Column(db.String(32), nullable=False, index=True)
+
+    __table_args__ = (
+        db.Index('ix_progress_events_user_seq', 'user_email', 'id'),
+        # Cada módulo é concluído uma vez por usuário, mesmo com vários workers
+        db.Index('uq_progress_events_user_module', 'user_email', 'course_id', 'module_id', unique=True),
+        {'sqlite_autoincrement': True},
+    )
+
+    def to_dict(self):
+        return {
+            'seq': self.id,
+            'type': self.type,
+            'user_email': self.user_email,
+            'course_id': self.course_id,
+            'module_id': self.module_id,
+            'points': self.points,
+            'course_completed': self.course_completed,
+            'timestamp': self.timestamp
+        }
+
+
+class ProgressAggregate(db.Model):
+    """Progresso materializado do usuário, gravado no mesmo commit do evento"""
+    __tablename__ = 'progress_aggregates'
+
+    user_email = db.Column(db.String(120), primary_key=True)
+    # Incrementada a cada gravação: só grava quem leu a versão atual
+    version = db.Column(db.Integer, nullable=False, default=1)
+    data = db.Column(db.Text, nullable=False)
+
+
+class ProgressStore:
+    """Progresso dos cursos como log de eventos com agregados materializados
+
+    O log de eventos e os agregados por usuário ficam no banco (leitura do
+    agregado por chave, sem reprocessar o histórico), valendo para todos os
+    workers e após reinícios. Usuários sem agregado gravado partem dos dados
+    de seed() ou dos pontos e cursos concluídos do perfil (user_accounts).
+    """
+
+    def __init__(self, catalog):
+        # Módulos e pontos de cada curso vêm da versão atual do catálogo
+        self._catalog = catalog
+        self._seeds = {}
+
+    def seed(self, user_email, total_points, completed_courses=(), completed_modules=None):
+        """Estado inicial do usuário (dados de demonstração ou migração)"""
+        self._seeds[user_email] = self._initial(total_points, completed_courses, completed_modules)
+
+    def events(self, user_email=None, after_seq=0, limit=None):
+        """Eventos em ordem de sequência após after_seq (opcionalmente só de um usuário)"""
+        query = ProgressEvent.query.filter(ProgressEvent.id > after_seq)
+        if user_email is not None:
+            query = query.filter(ProgressEvent.user_email == user_email)
+        query = query.order_by(ProgressEvent.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return [event.to_dict() for event in query]
+
+    def iter_events(self, start_date=None, end_date=None, course_id=None, completed_only=False,
+                    chunk_size=500):
+        """Eventos filtrados lidos do banco em lotes de chunk_size (exportação)"""
+        query = ProgressEvent.query
+        if start_date:
+            query = query.filter(ProgressEvent.timestamp >= start_date)
+        if end_date:
+            # timestamps ISO do dia end_date são menores que o dia seguinte
+            next_day = datetime.date.fromisoformat(end_date) + datetime.timedelta(days=1)
+            query = query.filter(ProgressEvent.timestamp < next_day.isoformat())
+        if course_id:
+            query = query.filter(ProgressEvent.course_id == course_id)
+        if completed_only:
+            query = query.filter(ProgressEvent.course_completed.is_(True))
+        for event in query.order_by(ProgressEvent.id).yield_per(chunk_size):
+            yield event.to_dict()
+
+    def get(self, user_email, profile=None):
+        """Agregado materializado do usuário (cópia para leitura)
+
+        profile (perfil do diretório) é o ponto de partida de quem ainda não
+        tem agregado gravado.
+        """
+        aggregate = self._load(user_email, profile)[1]
+        return {
+            'completed_courses': list(aggregate['completed_courses']),
+            'in_progress_courses': [dict(c) for c in aggregate['in_progress_courses']],
+            'available_courses': list(aggregate['available_courses']),
+            'total_points': aggregate['total_points'],
+            'level': aggregate['level']
+        }
+
+    def total_modules(self, course_id):
+        return len(self._catalog.snapshot().get(course_id)['modules'])
+
+    def record_module_completion(self, user_email, course_id, module_id, profile=None):
+        """Registrar conclusão de módulo; retorna o evento ou None se já concluído
+
+        Evento e agregado vão no mesmo commit. O índice único do log recusa
+        uma conclusão repetida e a versão do agregado recusa uma gravação
+        baseada em leitura antiga; nos dois casos o agregado é relido.
+        """
+        for _ in range(WRITE_ATTEMPTS):
+            version, aggregate = self._load(user_email, profile)
+            done = aggregate['completed_modules'].get(course_id, [])
+            if module_id in done:
+                return None
+
+            course = self._catalog.snapshot().get(course_id)
+            points = POINTS_PER_MODULE
+            course_completed = len(done) + 1 >= len(course['modules'])
+            if course_completed:
+                points += course['points_reward']
+
+            event = {
+                'type': 'module_completed',
+                'user_email': user_email,
+                'course_id': course_id,
+                'module_id': module_id,
+                'points': points,
+                'course_completed': course_completed,
+                'timestamp': datetime.datetime.now().isoformat()
+            }
+            self._apply(aggregate, event)
+            row = ProgressEvent(**event)
+            db.session.add(row)
+            if self._save(user_email, version, aggregate):
+                event['seq'] = row.id
+                return event
+        return None
+
+    def _load(self, user_email, profile=None):
+        """(versão, agregado) gravados no banco; versão 0 se ainda não houver"""
+        row = db.session.get(ProgressAggregate, user_email, populate_existing=True)
+        if row is not None:
+            return row.version, json.loads(row.data)
+        seed = self._seeds.get(user_email)
+        if seed:
+            return 0, copy.deepcopy(seed)
+        if profile:
+            return 0, self._initial(profile['points'], profile['completed_courses'])
+        return 0, self._new_aggregate()
+
+    def _initial(self, total_points, completed_courses=(), completed_modules=None):
+        catalog = self._catalog.snapshot()
+        aggregate = self._new_aggregate()
+        aggregate['total_points'] = total_points
+        aggregate['level'] = level_for(total_points)
+        # Cursos que saíram do catálogo continuam contando só nos pontos
+        for course_id in completed_courses:
+            if course_id in catalog:
+                aggregate['completed_modules'][course_id] = list(range(1, self.total_modules(course_id) + 1))
+                self._finish_course(aggregate, course_id)
+        for course_id, modules in (completed_modules or {}).items():
+            aggregate['completed_modules'][course_id] = sorted(modules)
+            self._update_course(aggregate, course_id)
+        return aggregate
+
+    @staticmethod
+    def _save(user_email, version, aggregate):
+        """Gravar o agregado e o evento pendente na sessão; False se outro pedido gravou antes"""
+        data = json.dumps(aggregate)
+        try:
+            if version:
+                updated = (
+                    ProgressAggregate.query
+                    .filter_by(user_email=user_email, version=version)
+                    .update({'data': data, 'version': version + 1}, synchronize_session=False)
+                )
+                if not updated:
+                    db.session.rollback()
+                    return False
+            else:
+                db.session.add(ProgressAggregate(user_email=user_email, version=1, data=data))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+
+    def _apply(self, aggregate, event):
+        aggregate['completed_modules'].setdefault(event['course_id'], []).append(event['module_id'])
+        aggregate['total_points'] += event['points']
+        aggregate['level'] = level_for(aggregate['total_points'])
+        if event['course_completed']:
+            self._finish_course(aggregate, event['course_id'])
+        else:
+            self._update_course(aggregate, event['course_id'])
+
+    def _new_aggregate(self):
+        return {
+            'completed_courses': [],
+            'in_progress_courses': [],
+            'available_courses': list(self._catalog.snapshot().by_id),
+            'total_points': 0,
+            'level': level_for(0),
+            # course_id -> módulos concluídos
+            'completed_modules': {}
+        }
+
+    def _update_course(self, aggregate, course_id):
+        done = set(aggregate['completed_modules'][course_id])
+        total_modules = self.total_modules(course_id)
+        # Próximo módulo ainda não concluído
+        current_module = next((m for m in range(1, total_modules + 1) if m not in done), total_modules)
+        entry = next((c for c in aggregate['in_progress_courses'] if c['course_id'] == course_id), None)
+        if entry is None:
+            entry = {'course_id': course_id, 'total_modules': total_modules}
+            aggregate['in_progress_courses'].append(entry)
+            if course_id in aggregate['available_courses']:
+                aggregate['available_courses'].remove(course_id)
+        entry['progress'] = round(len(done) * 100 / total_modules)
+        entry['current_module'] = current_module
+
+    @staticmethod
+    def _finish_course(aggregate, course_id):
+        aggregate['in_progress_courses'] = [
+            c for c in aggregate['in_progress_courses'] if c['course_id'] != course_id
+        ]
+        if course_id in aggregate['available_courses']:
+            aggregate['available_courses'].remove(course_id)
+        if course_id not in aggregate['completed_courses']:
+            aggregate['completed_courses'].append(course_id)
@@ -0,0 +1,303 @@
+import bisect
+import threading
+
+
+class SortedKeyList:
+    """Lista ordenada em blocos com árvore de Fenwick sobre o tamanho dos blocos
+
+    Inserção e remoção fazem bisect no índice de máximos e no bloco (até
+    2 * LOAD itens); posição e acesso por índice descem a árvore de Fenwick,
+    então todas as operações são O(log n). A árvore só é reconstruída quando
+    um bloco é dividido ou esvaziado.
+    """
+
+    LOAD = 256
+
+    def __init__(self):
+        self._buckets = []
+        self._maxes = []
+        self._tree = [0]
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def add(self, key):
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._rebuild()
+        else:
+            i = bisect.bisect_left(self._maxes, key)
+            if i == len(self._maxes):
+                i -= 1
+            bucket = self._buckets[i]
+            bisect.insort(bucket, key)
+            self._maxes[i] = bucket[-1]
+            if len(bucket) > 2 * self.LOAD:
+                self._buckets[i:i + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+                self._maxes[i:i + 1] = [bucket[self.LOAD - 1], bucket[-1]]
+                self._rebuild()
+            else:
+                self._update(i, 1)
+        self._len += 1
+
+    def remove(self, key):
+        i = bisect.bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        j = bisect.bisect_left(bucket, key)
+        if bucket[j] != key:
+            raise ValueError(key)
+        del bucket[j]
+        if bucket:
+            self._maxes[i] = bucket[-1]
+            self._update(i, -1)
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+            self._rebuild()
+        self._len -= 1
+
+    def index(self, key):
+        """Posição (0-based) da chave na ordem"""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            raise ValueError(key)
+        bucket = self._buckets[i]
+        j = bisect.bisect_left(bucket, key)
+        if bucket[j] != key:
+            raise ValueError(key)
+        return self._prefix(i) + j
+
+    def bisect_right(self, key):
+        """Posição do primeiro item maior que key"""
+        i = bisect.bisect_right(self._maxes, key)
+        if i == len(self._maxes):
+            return self._len
+        return self._prefix(i) + bisect.bisect_right(self._buckets[i], key)
+
+    def islice(self, start, stop):
+        """Itens nas posições [start, stop) sem percorrer os anteriores"""
+        start = max(start, 0)
+        stop = min(stop, self._len)
+        if start >= stop:
+            return
+        i, j = self._locate(start)
+        remaining = stop - start
+        while remaining > 0:
+            bucket = self._buckets[i]
+            chunk = bucket[j:j + remaining]
+            yield from chunk
+            remaining -= len(chunk)
+            i += 1
+            j = 0
+
+    def _rebuild(self):
+        n = len(self._buckets)
+        tree = [0] * (n + 1)
+        for i, bucket in enumerate(self._buckets):
+            j = i + 1
+            tree[j] += len(bucket)
+            parent = j + (j & -j)
+            if parent <= n:
+                tree[parent] += tree[j]
+        self._tree = tree
+
+    def _update(self, i, delta):
+        j = i + 1
+        n = len(self._buckets)
+        while j <= n:
+            self._tree[j] += delta
+            j += j & -j
+
+    def _prefix(self, i):
+        """Total de itens nos i primeiros blocos"""
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, index):
+        """(bloco, posição no bloco) do item de índice global index"""
+        pos = 0
+        remaining = index
+        step = 1 << (len(self._buckets).bit_length() - 1) if self._buckets else 0
+        while step:
+            nxt = pos + step
+            if nxt <= len(self._buckets) and self._tree[nxt] <= remaining:
+                pos = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return pos, remaining
+
+
+class Leaderboard:
+    """Ranking atualizado incrementalmente a cada pontuação
+
+    Ordena por pontos (decrescente) e, em caso de empate, pelo id do membro.
+    As posições são calculadas na consulta, nunca armazenadas.
+    """
+
+    def __init__(self, entries=(), key='name'):
+        self.key = key
+        self._members = {}
+        self._order = SortedKeyList()
+        self._lock = threading.RLock()
+        for entry in entries:
+            attrs = {field: value for field, value in entry.items() if field not in (key, 'points', 'position')}
+            self.set_points(entry[key], entry['points'], **attrs)
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, member_id):
+        return member_id in self._members
+
+    def set_points(self, member_id, points, **attrs):
+        """Definir a pontuação do membro (inserindo se necessário)"""
+        with self._lock:
+            entry = self._members.get(member_id)
+            if entry is None:
+                entry = {self.key: member_id, 'points': points}
+                self._members[member_id] = entry
+            else:
+                self._order.remove((-entry['points'], member_id))
+                entry['points'] = points
+            entry.update(attrs)
+            self._order.add((-points, member_id))
+            return self._with_position(entry, self._order.index((-points, member_id)))
+
+    def add_points(self, member_id, delta, **attrs):
+        """Somar pontos ao membro (inserindo com 0 se não existir)"""
+        with self._lock:
+            entry = self._members.get(member_id)
+            current = entry['points'] if entry else 0
+            return self.set_points(member_id, current + delta, **attrs)
+
+    def remove(self, member_id):
+        """Retirar o membro do ranking (se estiver nele)"""
+        with self._lock:
+            entry = self._members.pop(member_id, None)
+            if entry is not None:
+                self._order.remove((-entry['points'], member_id))
+
+    def clear(self):
+        with self._lock:
+            self._members = {}
+            self._order = SortedKeyList()
+
+    def rank(self, member_id):
+        """Posição (1-based) do membro, ou None"""
+        with self._lock:
+            entry = self._members.get(member_id)
+            if entry is None:
+                return None
+            return self._order.index((-entry['points'], member_id)) + 1
+
+    def top(self, k):
+        """Os k primeiros colocados"""
+        return self.slice(0, k)
+
+    def around(self, member_id, radius=2):
+        """Janela de vizinhos em torno do membro (radius acima e abaixo)"""
+        with self._lock:
+            position = self.rank(member_id)
+            if position is None:
+                return []
+            return self.slice(position - 1 - radius, position + radius)
+
+    def slice(self, start, stop):
+        """Entradas nas posições 0-based [start, stop)"""
+        with self._lock:
+            start = max(start, 0)
+            return [
+                self._with_position(self._members[member_id], start + offset)
+                for offset, (_, member_id) in enumerate(self._order.islice(start, stop))
+            ]
+
+    def page_after(self, points, member_id, limit):
+        """Até limit entradas seguintes a (points, member_id) na ordem do ranking
+
+        O cursor é a chave de ordenação do último item visto, não a posição:
+        se pontuações mudarem entre uma página e outra, a próxima continua
+        logo depois dele, sem repetir nem pular quem não mudou.
+        """
+        with self._lock:
+            start = 0 if member_id is None else self._order.bisect_right((-points, member_id))
+            return self.slice(start, start + limit)
+
+    @staticmethod
+    def _with_position(entry, index):
+        result = dict(entry)
+        result['position'] = index + 1
+        return result
+
+
+class SharedLeaderboard:
+    """Leaderboard espelhando um namespace do estado compartilhado
+
+    As pontuações ficam no backend (member_id -> {'points': ..., atributos});
+    cada processo mantém o Leaderboard local e aplica só as entradas
+    alteradas a cada sincronização, então as consultas continuam O(log n).
+    """
+
+    def __init__(self, namespace, key='name'):
+        self.namespace = namespace
+        self.key = key
+        self._board = Leaderboard(key=key)
+        namespace.subscribe(self._apply)
+
+    def __len__(self):
+        return len(self._synced())
+
+    def __contains__(self, member_id):
+        return member_id in self._synced()
+
+    def set_points(self, member_id, points, **attrs):
+        """Definir a pontuação do membro (inserindo se necessário)"""
+        self.namespace.update(member_id, lambda entry: dict(entry or {}, **attrs, points=points))
+        return self.around(member_id, 0)[0]
+
+    def add_points(self, member_id, delta, **attrs):
+        """Somar pontos ao membro de forma atômica entre processos"""
+        self.namespace.update(
+            member_id, lambda entry: dict(entry or {}, **attrs, points=(entry or {}).get('points', 0) + delta)
+        )
+        return self.around(member_id, 0)[0]
+
+    def rank(self, member_id):
+        return self._synced().rank(member_id)
+
+    def top(self, k):
+        return self._synced().top(k)
+
+    def around(self, member_id, radius=2):
+        return self._synced().around(member_id, radius)
+
+    def slice(self, start, stop):
+        return self._synced().slice(start, stop)
+
+    def page_after(self, points, member_id, limit):
+        return self._synced().page_after(points, member_id, limit)
+
+    def _synced(self):
+        self.namespace.refresh()
+        return self._board
+
+    def _apply(self, member_id, entry):
+        if member_id is None:
+            self._board.clear()
+        elif entry is None:
+            self._board.remove(member_id)
+        else:
+            attrs = {field: value for field, value in entry.items() if field != 'points'}
+            self._board.set_points(member_id, entry['points'], **attrs)
+
+
+def leaderboard_seed(entries, key='name'):
+    """Entradas iniciais no formato do namespace de um SharedLeaderboard"""
+    return {
+        entry[key]: {field: value for field, value in entry.items() if field not in (key, 'position')}
+        for entry in entries
+    }
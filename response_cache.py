@@ -0,0 +1,61 @@
+from flask import current_app, request
+from src.routes.state import STATE
+import hashlib
+import threading
+
+
+class ResponseCache:
+    """Cache de respostas JSON serializadas, com ETag forte e GET condicional
+
+    As entradas são agrupadas por namespace (ex.: 'courses', 'ranking');
+    invalidate(namespace) descarta todas as respostas montadas a partir
+    daqueles dados. As versões dos namespaces ficam no estado compartilhado,
+    então uma invalidação feita em um worker vale para todos.
+    """
+
+    def __init__(self, state):
+        self._state = state
+        self._entries = {}
+        self._versions = state.namespace('response_cache')
+        self._lock = threading.Lock()
+
+    def invalidate(self, namespace):
+        """Descartar respostas do namespace após mudança nos dados"""
+        self._versions.update(namespace, lambda version: (version or 0) + 1)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == namespace]:
+                del self._entries[key]
+
+    def lookup(self, namespace, key, build):
+        """Corpo serializado e ETag, montando com build() só quando necessário"""
+        cache_key = (namespace, key)
+        entry = self._entries.get(cache_key)
+        version = self._versions.get(namespace, 0)
+        if entry is not None and entry[0] == version:
+            return entry[1], entry[2]
+
+        # A invalidação vista aqui pode ter vindo de outro worker: os dados
+        # usados por build() precisam estar pelo menos tão atualizados quanto ela
+        self._state.refresh(force=True)
+        body = current_app.json.dumps(build()).encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            # Só guarda se ninguém invalidou o namespace durante a montagem
+            if self._versions.get(namespace, 0) == version:
+                self._entries[cache_key] = (version, body, etag)
+        return body, etag
+
+    def response(self, namespace, key, build):
+        """Resposta 200 com o corpo em cache, ou 304 se o cliente já tem a versão"""
+        body, etag = self.lookup(namespace, key, build)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(body, status=200, mimetype='application/json')
+        response.set_etag(etag)
+        # Clientes podem guardar a resposta, mas devem revalidar com If-None-Match
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+RESPONSE_CACHE = ResponseCache(STATE)
@@ -1,6 +1,13 @@
 from flask import Blueprint, request, jsonify
-import jwt
+from src.routes.auth_middleware import verify_token_decorator, admin_required
+from src.routes.exam_store import ExamStore, EXAM_RESPONSE_FIELDS
+from src.routes.availability import SlotCalendar, SlotCapacity
+from src.routes.notifications import NOTIFICATION_OUTBOX
+from src.routes.catalog import COURSE_CATALOG
+from src.routes.pagination import PageRequest, InvalidPageRequest
+from src.routes.user_directory import USER_DIRECTORY, normalize_email
 import datetime
+import itertools
 
 scheduling_bp = Blueprint('scheduling', __name__)
 
@@ -10,7 +17,35 @@ AVAILABLE_TIMES = {
     'saturday': ['08:00', '09:00', '10:00', '11:00']
 }
 
-# Agendamentos simulados (em produção seria no banco de dados)
+# Bitmaps pré-calculados sobre os modelos de horários
+SLOT_CALENDAR = SlotCalendar(AVAILABLE_TIMES)
+
+# Examinadores/salas de prova (uma prova por sala em cada horário) e
+# provas simultâneas por curso, limitadas pelos equipamentos de prática
+EXAM_ROOMS = ['Sala 1', 'Sala 2']
+COURSE_SLOT_LIMITS = {
+    'nr35': 1,
+    'empilhadeira': 1
+}
+SLOT_CAPACITY = SlotCapacity(EXAM_ROOMS, COURSE_SLOT_LIMITS)
+
+# Limite de dias por consulta de intervalo (uma visão mensal com folga)
+MAX_RANGE_DAYS = 62
+
+# Agendamento em lote: tamanho máximo da equipe e novas tentativas quando
+# outro pedido ocupa um dos horários escolhidos antes da gravação
+MAX_BATCH_SIZE = 100
+MAX_BATCH_ATTEMPTS = 3
+
+# Busca do próximo horário livre: horizonte de reservas, dias por consulta
+# ao banco e quantidade de sugestões
+BOOKING_HORIZON_DAYS = 180
+NEXT_SLOTS_CHUNK_DAYS = 31
+DEFAULT_NEXT_SLOTS = 5
+MAX_NEXT_SLOTS = 20
+CONFLICT_SUGGESTIONS = 3
+
+# Agendamentos de demonstração, gravados no banco na primeira inicialização
 SCHEDULED_EXAMS = [
     {
         'id': 1,
@@ -25,64 +60,44 @@ SCHEDULED_EXAMS = [
     }
 ]
 
-def verify_token_decorator(f):
-    """Decorator para verificar token JWT"""
-    def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            payload = jwt.decode(token, 'secret_key', algorithms=['HS256'])
-            request.user_email = payload['email']
-            return f(*args, **kwargs)
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expirado'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token inválido'}), 401
-    
-    decorated_function.__name__ = f.__name__
-    return decorated_function
+# Agendamentos persistidos no banco (tabela scheduled_exams, com passados e
+# cancelados movidos para scheduled_exams_archive pela compactação); cada
+# alteração grava a notificação ao aluno no outbox, na mesma transação
+EXAM_STORE = ExamStore(SLOT_CAPACITY, outbox=NOTIFICATION_OUTBOX)
 
 @scheduling_bp.route('/available-times', methods=['GET'])
 def get_available_times():
     """Obter horários disponíveis para agendamento"""
     date_param = request.args.get('date')
+    course_id = request.args.get('course_id')
     
     if not date_param:
         return jsonify({'error': 'Parâmetro date é obrigatório (formato: YYYY-MM-DD)'}), 400
     
     try:
         selected_date = datetime.datetime.strptime(date_param, '%Y-%m-%d')
-        weekday = selected_date.weekday()  # 0 = Monday, 6 = Sunday
         
         # Verificar se é dia útil ou sábado
-        if weekday < 5:  # Segunda a sexta
-            available_times = AVAILABLE_TIMES['weekdays']
-        elif weekday == 5:  # Sábado
-            available_times = AVAILABLE_TIMES['saturday']
-        else:  # Domingo
+        template = SLOT_CALENDAR.template_for(selected_date)
+        if template is None:  # Domingo
             return jsonify({
                 'success': True,
                 'available_times': [],
                 'message': 'Não atendemos aos domingos'
             }), 200
         
-        # Filtrar horários já agendados para esta data
-        scheduled_times = [
-            exam['time'] for exam in SCHEDULED_EXAMS 
-            if exam['date'] == date_param and exam['status'] != 'cancelled'
-        ]
-        
-        available_times = [time for time in available_times if time not in scheduled_times]
+        # Filtrar horários lotados nesta data (para o curso, se informado)
+        usage = EXAM_STORE.usage(date_param)
+        free_mask = SLOT_CALENDAR.free_mask(template, SLOT_CAPACITY.full_times(usage, course_id))
+        available_times = SLOT_CALENDAR.times_from_mask(template, free_mask)
         
         return jsonify({
             'success': True,
             'date': date_param,
             'available_times': available_times,
+            'remaining_seats': {
+                time: SLOT_CAPACITY.remaining(usage.get(time, {}), course_id) for time in available_times
+            },
             'business_hours': {
                 'weekdays': 'Segunda a Sexta: 8h às 18h',
                 'saturday': 'Sábado: 8h às 12h',
@@ -93,6 +108,126 @@ def get_available_times():
     except ValueError:
         return jsonify({'error': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
 
+def full_times_between(start_date, end_date, course_id=None):
+    """Horários lotados por data no intervalo (para qualquer curso ou para course_id)"""
+    usage = EXAM_STORE.usage_between(start_date.isoformat(), end_date.isoformat())
+    return SLOT_CAPACITY.full_times_by_date(usage, course_id)
+
+def find_next_slots(start_date, count, weekdays=None, masks=None, course_id=None):
+    """Os count horários com lugar livre mais próximos a partir de start_date
+
+    Percorre o horizonte em blocos de NEXT_SLOTS_CHUNK_DAYS dias (uma
+    consulta agrupada por bloco) e para assim que encontra count horários.
+    Não há índice de dias livres: a busca é linear nos dias visitados, e o
+    pior caso (horizonte todo lotado) fica limitado a BOOKING_HORIZON_DAYS
+    dias e a BOOKING_HORIZON_DAYS / NEXT_SLOTS_CHUNK_DAYS consultas.
+    """
+    today = datetime.date.today()
+    start = max(start_date, today + datetime.timedelta(days=1))
+    horizon_end = today + datetime.timedelta(days=BOOKING_HORIZON_DAYS)
+    slots = []
+    while start <= horizon_end and len(slots) < count:
+        end = min(start + datetime.timedelta(days=NEXT_SLOTS_CHUNK_DAYS - 1), horizon_end)
+        free = SLOT_CALENDAR.free_slots(start, end, full_times_between(start, end, course_id), weekdays, masks)
+        slots.extend(itertools.islice(free, count - len(slots)))
+        start = end + datetime.timedelta(days=1)
+    return [{'date': date, 'time': time} for date, time in slots]
+
+def assign_slots(roster, slots, busy):
+    """Um horário de slots para cada email, fora dos horários em que ele já tem prova
+
+    Retorna [(email, (data, hora))] na ordem do roster, ou None se faltar
+    horário. Com len(roster) + total de horários em busy, nunca falta: cada
+    aluno só perde os seus horários ocupados e os já atribuídos aos anteriores.
+    """
+    remaining = list(slots)
+    assignment = []
+    for email in roster:
+        taken = busy.get(email, set())
+        index = next((i for i, slot in enumerate(remaining) if slot not in taken), None)
+        if index is None:
+            return None
+        assignment.append((email, remaining.pop(index)))
+    return assignment
+
+@scheduling_bp.route('/available-times/next', methods=['GET'])
+def get_next_available_times():
+    """Obter os próximos horários livres a partir de uma data, com preferências"""
+    try:
+        start_date = datetime.datetime.strptime(
+            request.args.get('date', datetime.date.today().isoformat()), '%Y-%m-%d'
+        ).date()
+    except ValueError:
+        return jsonify({'error': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+    
+    count = min(max(request.args.get('count', DEFAULT_NEXT_SLOTS, type=int), 1), MAX_NEXT_SLOTS)
+    
+    # Dias da semana preferidos: ?weekdays=0,2,4 (0 = segunda)
+    weekdays = None
+    if request.args.get('weekdays'):
+        try:
+            weekdays = {int(day) for day in request.args['weekdays'].split(',')}
+        except ValueError:
+            return jsonify({'error': 'weekdays deve ser uma lista de números de 0 (segunda) a 6 (domingo)'}), 400
+    
+    # Faixa de horário preferida: ?from_time=08:00&to_time=12:00
+    time_from = request.args.get('from_time')
+    time_to = request.args.get('to_time')
+    for value in (time_from, time_to):
+        if value is not None:
+            try:
+                datetime.datetime.strptime(value, '%H:%M')
+            except ValueError:
+                return jsonify({'error': 'Formato de horário inválido. Use HH:MM'}), 400
+    masks = SLOT_CALENDAR.preference_masks(time_from, time_to) if time_from or time_to else None
+    
+    return jsonify({
+        'success': True,
+        'date': start_date.isoformat(),
+        'horizon_days': BOOKING_HORIZON_DAYS,
+        'available_slots': find_next_slots(start_date, count, weekdays, masks, request.args.get('course_id'))
+    }), 200
+
+@scheduling_bp.route('/available-times/range', methods=['GET'])
+def get_available_times_range():
+    """Obter horários disponíveis de vários dias (ex.: um mês) em uma chamada"""
+    start_param = request.args.get('start')
+    end_param = request.args.get('end')
+    course_id = request.args.get('course_id')
+    
+    if not start_param or not end_param:
+        return jsonify({'error': 'Parâmetros start e end são obrigatórios (formato: YYYY-MM-DD)'}), 400
+    
+    try:
+        start_date = datetime.datetime.strptime(start_param, '%Y-%m-%d').date()
+        end_date = datetime.datetime.strptime(end_param, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+    
+    if end_date < start_date:
+        return jsonify({'error': 'end deve ser igual ou posterior a start'}), 400
+    
+    if (end_date - start_date).days >= MAX_RANGE_DAYS:
+        return jsonify({'error': f'O intervalo máximo é de {MAX_RANGE_DAYS} dias'}), 400
+    
+    # Uma consulta para o intervalo inteiro e um passe sobre os dias
+    taken_by_date = full_times_between(start_date, end_date, course_id)
+    
+    # Bit i de free_mask ligado = templates[template][i] com lugar; domingos são omitidos
+    days = [
+        {'date': date_str, 'template': template, 'free_mask': free_mask}
+        for date_str, template, free_mask
+        in SLOT_CALENDAR.range_availability(start_date, end_date, taken_by_date)
+    ]
+    
+    return jsonify({
+        'success': True,
+        'start': start_param,
+        'end': end_param,
+        'templates': SLOT_CALENDAR.templates,
+        'days': days
+    }), 200
+
 @scheduling_bp.route('/schedule-exam', methods=['POST'])
 @verify_token_decorator
 def schedule_exam():
@@ -129,30 +264,16 @@ def schedule_exam():
     if exam_time not in valid_times:
         return jsonify({'error': 'Horário não disponível'}), 400
     
-    # Verificar se já existe agendamento para este horário
-    existing_exam = next((
-        exam for exam in SCHEDULED_EXAMS 
-        if exam['date'] == exam_date and exam['time'] == exam_time and exam['status'] != 'cancelled'
-    ), None)
-    
-    if existing_exam:
-        return jsonify({'error': 'Horário já ocupado'}), 409
-    
-    # Mapear nomes dos cursos
-    course_names = {
-        'nr35': 'NR-35 - Trabalho em Altura',
-        'nr10': 'NR-10 - Segurança em Eletricidade',
-        'nr18': 'NR-18 - Construção Civil',
-        'primeiros-socorros': 'Primeiros Socorros',
-        'cipa': 'CIPA - Comissão Interna',
-        'empilhadeira': 'Operador de Empilhadeira'
-    }
+    course = COURSE_CATALOG.snapshot().get(course_id)
+    if course is None:
+        return jsonify({'error': 'Curso não encontrado'}), 404
+    course_name = course['title']
     
-    course_name = course_names.get(course_id, course_id)
+    if EXAM_STORE.user_busy(request.user_email, exam_date, exam_time):
+        return jsonify({'error': 'Você já tem uma prova agendada neste horário'}), 409
     
     # Criar novo agendamento
     new_exam = {
-        'id': len(SCHEDULED_EXAMS) + 1,
         'user_email': request.user_email,
         'course_id': course_id,
         'course_name': course_name,
@@ -163,7 +284,14 @@ def schedule_exam():
         'created_at': datetime.datetime.now().isoformat()
     }
     
-    SCHEDULED_EXAMS.append(new_exam)
+    # A reserva pega uma sala e um lugar do curso livres; os índices únicos
+    # barram a gravação se outro worker lotar o horário ao mesmo tempo
+    new_exam = EXAM_STORE.book(new_exam)
+    if new_exam is None:
+        return jsonify({
+            'error': 'Horário já ocupado',
+            'next_available': find_next_slots(selected_date.date(), CONFLICT_SUGGESTIONS, course_id=course_id)
+        }), 409
     
     return jsonify({
         'success': True,
@@ -172,21 +300,138 @@ def schedule_exam():
         'whatsapp_message': f'Olá! Sua prova de {course_name} foi agendada para {exam_date} às {exam_time}. Confirmaremos em breve!'
     }), 201
 
+@scheduling_bp.route('/schedule-team', methods=['POST'])
+@admin_required
+def schedule_team():
+    """Agendar provas de uma equipe inteira em um intervalo de datas (administradores)"""
+    data = request.get_json()
+    
+    required_fields = ['course_id', 'roster', 'start', 'end']
+    for field in required_fields:
+        if not data or field not in data:
+            return jsonify({'error': f'{field} é obrigatório'}), 400
+    
+    course_id = data['course_id']
+    roster = data['roster']
+    notes = data.get('notes', '')
+    
+    if not isinstance(roster, list) or not roster or not all(isinstance(email, str) for email in roster):
+        return jsonify({'error': 'roster deve ser uma lista de emails'}), 400
+    
+    roster = [normalize_email(email) for email in roster]
+    if len(set(roster)) != len(roster):
+        return jsonify({'error': 'roster contém emails repetidos'}), 400
+    
+    if len(roster) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'O máximo é de {MAX_BATCH_SIZE} pessoas por lote'}), 400
+    
+    # Só alunos cadastrados, todos da mesma equipe
+    members = {email: USER_DIRECTORY.get(email) for email in roster}
+    unknown = [email for email, user in members.items() if user is None]
+    if unknown:
+        return jsonify({'error': 'Alunos não cadastrados no roster', 'emails': unknown}), 400
+    teams = {user['team'] for user in members.values()}
+    if len(teams) != 1 or '' in teams:
+        return jsonify({'error': 'Todos os alunos do roster devem ser da mesma equipe'}), 400
+    team = teams.pop()
+    
+    try:
+        start_date = datetime.datetime.strptime(data['start'], '%Y-%m-%d').date()
+        end_date = datetime.datetime.strptime(data['end'], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
+    
+    # Só datas futuras entram na alocação
+    start_date = max(start_date, datetime.date.today() + datetime.timedelta(days=1))
+    if end_date < start_date:
+        return jsonify({'error': 'O intervalo deve terminar em uma data futura'}), 400
+    
+    if (end_date - start_date).days >= MAX_RANGE_DAYS:
+        return jsonify({'error': f'O intervalo máximo é de {MAX_RANGE_DAYS} dias'}), 400
+    
+    course = COURSE_CATALOG.snapshot().get(course_id)
+    if course is None:
+        return jsonify({'error': 'Curso não encontrado'}), 404
+    course_name = course['title']
+    created_at = datetime.datetime.now().isoformat()
+    
+    for _ in range(MAX_BATCH_ATTEMPTS):
+        # Uma consulta de ocupação para o intervalo e alocação pelos bitmaps,
+        # usando todos os lugares restantes de cada horário
+        usage = EXAM_STORE.usage_between(start_date.isoformat(), end_date.isoformat())
+        # Horários em que cada aluno já tem prova ficam fora da parte dele;
+        # alocar um lugar a mais por horário ocupado garante que sobra um para todos
+        busy = EXAM_STORE.busy_slots(roster, start_date.isoformat(), end_date.isoformat())
+        slots = SLOT_CALENDAR.allocate(
+            start_date, end_date, SLOT_CAPACITY.full_times_by_date(usage, course_id),
+            len(roster) + sum(len(taken) for taken in busy.values()),
+            seats=lambda date, time: SLOT_CAPACITY.remaining(usage.get(date, {}).get(time, {}), course_id)
+        )
+        assignment = assign_slots(roster, slots, busy)
+        if assignment is None:
+            return jsonify({
+                'error': 'Não há horários livres suficientes no intervalo',
+                'free_slots': len(slots),
+                'requested': len(roster)
+            }), 409
+        
+        exams = EXAM_STORE.book_many([
+            {
+                'user_email': email,
+                'course_id': course_id,
+                'course_name': course_name,
+                'date': date,
+                'time': time,
+                'status': 'pending',
+                'notes': notes,
+                'created_at': created_at
+            }
+            for email, (date, time) in assignment
+        ])
+        if exams is not None:
+            break
+    else:
+        return jsonify({'error': 'Horários ocupados durante o agendamento, tente novamente'}), 409
+    
+    return jsonify({
+        'success': True,
+        'message': f'{len(exams)} provas agendadas com sucesso!',
+        'course_id': course_id,
+        'course_name': course_name,
+        'team': team,
+        'scheduled_by': request.user_email,
+        'exams': exams
+    }), 201
+
 @scheduling_bp.route('/my-exams', methods=['GET'])
 @verify_token_decorator
 def get_my_exams():
-    """Obter agendamentos do usuário logado"""
-    user_exams = [
-        exam for exam in SCHEDULED_EXAMS 
-        if exam['user_email'] == request.user_email
-    ]
-    
-    # Ordenar por data
-    user_exams.sort(key=lambda x: (x['date'], x['time']))
+    """Obter agendamentos do usuário logado (?limit=, ?cursor= e ?fields= opcionais)
+
+    Provas passadas e canceladas já arquivadas só aparecem com ?include_history=1.
+    """
+    try:
+        page = PageRequest(request.args, EXAM_RESPONSE_FIELDS)
+        after = page.cursor_value(d=str, t=str, i=int)
+    except InvalidPageRequest as error:
+        return jsonify({'error': str(error)}), 400
+    
+    # Ordenado por data e hora pelo índice (user_email, date, time); a página
+    # seguinte continua depois do último (date, time, id) entregue
+    user_exams = EXAM_STORE.for_user(
+        request.user_email,
+        limit=page.limit + 1 if page.paginated else None,
+        after=after,
+        include_history=request.args.get('include_history') in ('1', 'true')
+    )
+    user_exams, next_cursor = page.split(
+        user_exams, lambda exam: {'d': exam['date'], 't': exam['time'], 'i': exam['id']}
+    )
     
     return jsonify({
         'success': True,
-        'exams': user_exams
+        'exams': page.project(user_exams),
+        'next_cursor': next_cursor
     }), 200
 
 @scheduling_bp.route('/reschedule-exam/<int:exam_id>', methods=['PUT'])
@@ -201,7 +446,7 @@ def reschedule_exam(exam_id):
             return jsonify({'error': f'{field} é obrigatório'}), 400
     
     # Encontrar o agendamento
-    exam = next((exam for exam in SCHEDULED_EXAMS if exam['id'] == exam_id), None)
+    exam = EXAM_STORE.get(exam_id)
     
     if not exam:
         return jsonify({'error': 'Agendamento não encontrado'}), 404
@@ -232,20 +477,17 @@ def reschedule_exam(exam_id):
     if new_time not in valid_times:
         return jsonify({'error': 'Horário não disponível'}), 400
     
-    # Verificar conflitos (exceto o próprio agendamento)
-    existing_exam = next((
-        e for e in SCHEDULED_EXAMS 
-        if e['date'] == new_date and e['time'] == new_time 
-        and e['status'] != 'cancelled' and e['id'] != exam_id
-    ), None)
+    if EXAM_STORE.user_busy(request.user_email, new_date, new_time, exclude_id=exam_id):
+        return jsonify({'error': 'Você já tem uma prova agendada neste horário'}), 409
     
-    if existing_exam:
-        return jsonify({'error': 'Horário já ocupado'}), 409
-    
-    # Atualizar agendamento
-    exam['date'] = new_date
-    exam['time'] = new_time
-    exam['status'] = 'pending'  # Volta para pendente após reagendamento
+    # Volta para pendente após reagendamento; a capacidade é garantida pelos índices únicos
+    course_id = exam['course_id']
+    exam = EXAM_STORE.move(exam_id, new_date, new_time, status='pending')
+    if exam is None:
+        return jsonify({
+            'error': 'Horário já ocupado',
+            'next_available': find_next_slots(selected_date.date(), CONFLICT_SUGGESTIONS, course_id=course_id)
+        }), 409
     
     return jsonify({
         'success': True,
@@ -257,7 +499,7 @@ def reschedule_exam(exam_id):
 @verify_token_decorator
 def cancel_exam(exam_id):
     """Cancelar uma prova agendada"""
-    exam = next((exam for exam in SCHEDULED_EXAMS if exam['id'] == exam_id), None)
+    exam = EXAM_STORE.get(exam_id)
     
     if not exam:
         return jsonify({'error': 'Agendamento não encontrado'}), 404
@@ -265,7 +507,9 @@ def cancel_exam(exam_id):
     if exam['user_email'] != request.user_email:
         return jsonify({'error': 'Não autorizado'}), 403
     
-    exam['status'] = 'cancelled'
+    # None se outro pedido já cancelou: nenhuma notificação a mais é enviada, e
+    # a repetição (ex.: após timeout no cliente) recebe a mesma resposta
+    EXAM_STORE.set_status(exam_id, 'cancelled')
     
     return jsonify({
         'success': True,
@@ -0,0 +1,98 @@
+import bisect
+import re
+import unicodedata
+
+# Peso de cada campo na pontuação (um termo no título vale mais que na descrição)
+FIELD_WEIGHTS = {'title': 3.0, 'module': 2.0, 'description': 1.0}
+# Fração da pontuação quando o termo da consulta é só prefixo do termo indexado
+PREFIX_FACTOR = 0.5
+
+STOPWORDS = frozenset(
+    'a o e as os de da do das dos em no na nos nas um uma para por com ao aos à às'.split()
+)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:-[a-z0-9]+)*')
+
+
+def fold(text):
+    """Minúsculas sem acentos: 'Reanimação' -> 'reanimacao'"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text):
+    """Termos do texto; 'NR-35' gera 'nr', '35' e 'nr35'"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(fold(text)):
+        parts = token.split('-')
+        terms.extend(part for part in parts if part not in STOPWORDS)
+        if len(parts) > 1:
+            terms.append(''.join(parts))
+    return terms
+
+
+class SearchIndex:
+    """Índice invertido sobre título, descrição e módulos dos cursos
+
+    Montado uma vez por versão do catálogo. Cada termo da consulta casa
+    com termos iguais ou que começam com ele (bisect no vocabulário
+    ordenado); um curso só entra no resultado se casar com todos os termos.
+    """
+
+    def __init__(self, courses):
+        # termo -> {course_id: [peso, índices dos módulos que contêm o termo]}
+        postings = {}
+        for course in courses:
+            fields = [('title', course['title'], None), ('description', course['description'], None)]
+            fields += [('module', module, index) for index, module in enumerate(course['modules'])]
+            for field, text, module_index in fields:
+                for term in set(tokenize(text)):
+                    posting = postings.setdefault(term, {}).setdefault(course['id'], [0.0, []])
+                    posting[0] = max(posting[0], FIELD_WEIGHTS[field])
+                    if module_index is not None:
+                        posting[1].append(module_index)
+        self._postings = postings
+        self._vocabulary = sorted(postings)
+        self._courses = {course['id']: course for course in courses}
+
+    def _matches(self, query_term):
+        """{course_id: (pontuação, módulos)} para um termo da consulta"""
+        matches = {}
+        start = bisect.bisect_left(self._vocabulary, query_term)
+        for term in self._vocabulary[start:]:
+            if not term.startswith(query_term):
+                break
+            factor = 1.0 if term == query_term else PREFIX_FACTOR
+            for course_id, (weight, modules) in self._postings[term].items():
+                score, matched_modules = matches.get(course_id, (0.0, set()))
+                matches[course_id] = (max(score, weight * factor), matched_modules | set(modules))
+        return matches
+
+    def search(self, query, limit=10):
+        """Cursos que casam com todos os termos, do mais relevante ao menos"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        results = None
+        for term in terms:
+            matches = self._matches(term)
+            if results is None:
+                results = {course_id: [score, modules] for course_id, (score, modules) in matches.items()}
+            else:
+                results = {
+                    course_id: [total + matches[course_id][0], modules | matches[course_id][1]]
+                    for course_id, (total, modules) in results.items() if course_id in matches
+                }
+            if not results:
+                return []
+
+        ranked = sorted(results.items(), key=lambda item: (-item[1][0], self._courses[item[0]]['title']))
+        return [
+            {
+                'course': self._courses[course_id],
+                'score': round(score, 2),
+                'matched_modules': [self._courses[course_id]['modules'][index] for index in sorted(modules)]
+            }
+            for course_id, (score, modules) in ranked[:limit]
+        ]
@@ -0,0 +1,353 @@
+from contextlib import contextmanager
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Intervalo mínimo entre verificações de versão no backend compartilhado
+DEFAULT_REFRESH_INTERVAL = 0.5
+
+# Retorno de SharedNamespace.update quando não há nada a gravar
+UNCHANGED = object()
+
+
+class InProcessBackend:
+    """Estado em memória do processo (desenvolvimento e testes)
+
+    Os valores são guardados serializados em JSON, com a mesma semântica do
+    backend compartilhado: quem lê recebe uma cópia, nunca o objeto guardado.
+    """
+
+    def __init__(self):
+        # namespace -> {chave: (versão, json)}
+        self._entries = {}
+        self._versions = {}
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            yield
+
+    def version(self, namespace):
+        return self._versions.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            version = self._versions.get(namespace, 0) + 1
+            self._versions[namespace] = version
+            return version
+
+    def get(self, namespace, key):
+        entry = self._entries.get(namespace, {}).get(key)
+        return json.loads(entry[1]) if entry and entry[1] is not None else None
+
+    def changes_since(self, namespace, version):
+        """(versão atual, [(chave, valor ou None se removido)]) alterados após version"""
+        with self._lock:
+            entries = self._entries.get(namespace, {})
+            changes = [
+                (key, json.loads(value) if value is not None else None)
+                for key, (entry_version, value) in entries.items() if entry_version > version
+            ]
+            return self.version(namespace), changes
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            version = self.bump(namespace)
+            self._entries.setdefault(namespace, {})[key] = (version, json.dumps(value) if value is not None else None)
+            return version
+
+    def delete(self, namespace, key):
+        # Remoção fica registrada (valor None) para que outros leitores a vejam
+        self.set(namespace, key, None)
+
+
+class SqliteBackend:
+    """Estado compartilhado entre processos em um arquivo SQLite (modo WAL)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.executescript('''
+            CREATE TABLE IF NOT EXISTS state_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                value TEXT,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS ix_state_entries_version ON state_entries (namespace, version);
+            CREATE TABLE IF NOT EXISTS state_versions (
+                namespace TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+        ''')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # isolation_level=None: as transações são controladas explicitamente
+            connection = sqlite3.connect(self.path, timeout=15, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.depth = 0
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """Transação de escrita (BEGIN IMMEDIATE), reentrante na mesma thread"""
+        connection = self._connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        connection.execute('BEGIN IMMEDIATE')
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        else:
+            connection.execute('COMMIT')
+        finally:
+            self._local.depth = 0
+
+    def version(self, namespace):
+        row = self._connection().execute(
+            'SELECT version FROM state_versions WHERE namespace = ?', (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, namespace):
+        with self.transaction():
+            self._connection().execute(
+                'INSERT INTO state_versions (namespace, version) VALUES (?, 1) '
+                'ON CONFLICT (namespace) DO UPDATE SET version = version + 1',
+                (namespace,)
+            )
+            return self.version(namespace)
+
+    def get(self, namespace, key):
+        row = self._connection().execute(
+            'SELECT value FROM state_entries WHERE namespace = ? AND key = ?', (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def changes_since(self, namespace, version):
+        connection = self._connection()
+        # Leitura consistente: versão e linhas da mesma fotografia do banco
+        # (dentro de uma transação de escrita já aberta, a fotografia é ela)
+        in_transaction = self._local.depth > 0
+        if not in_transaction:
+            connection.execute('BEGIN')
+        try:
+            current = self.version(namespace)
+            rows = connection.execute(
+                'SELECT key, value FROM state_entries WHERE namespace = ? AND version > ?',
+                (namespace, version)
+            ).fetchall()
+        finally:
+            if not in_transaction:
+                connection.execute('COMMIT')
+        return current, [(key, json.loads(value) if value is not None else None) for key, value in rows]
+
+    def set(self, namespace, key, value):
+        with self.transaction():
+            version = self.bump(namespace)
+            self._connection().execute(
+                'INSERT INTO state_entries (namespace, key, version, value) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (namespace, key) DO UPDATE SET version = excluded.version, value = excluded.value',
+                (namespace, key, version, json.dumps(value) if value is not None else None)
+            )
+            return version
+
+    def delete(self, namespace, key):
+        self.set(namespace, key, None)
+
+
+class SharedNamespace:
+    """Mapa chave -> valor JSON em um namespace do backend, com cache de leitura
+
+    As leituras vêm de uma cópia local; no máximo a cada refresh_interval
+    segundos a versão do namespace é conferida no backend e só as entradas
+    alteradas desde a última sincronização são buscadas. Os valores lidos
+    não devem ser modificados: grave com set/update.
+    """
+
+    def __init__(self, store, name, seed=None):
+        self.store = store
+        self.name = name
+        self._seed = seed
+        self._listeners = []
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Descartar a cópia local (ex.: troca de backend)"""
+        with self._lock:
+            self._local = {}
+            self._version = 0
+            self._checked_at = 0
+            self._seeded = False
+            for listener in self._listeners:
+                listener(None, None)
+
+    def subscribe(self, listener):
+        """listener(chave, valor) a cada alteração sincronizada; (None, None) em reset"""
+        self._listeners.append(listener)
+
+    def refresh(self, force=False):
+        """Sincronizar com o backend se a verificação anterior já expirou"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.store.refresh_interval:
+            return
+        backend = self.store.backend
+        if not self._seeded:
+            # Idempotente (só grava chaves ausentes), pode rodar em paralelo
+            self._apply_seed(backend)
+            self._seeded = True
+        self._checked_at = now
+        # O backend é consultado fora do lock local: quem escreve pega o lock
+        # do backend antes do local, e a ordem inversa aqui travaria as duas
+        known = self._version
+        if backend.version(self.name) == known:
+            return
+        version, changes = backend.changes_since(self.name, known)
+        with self._lock:
+            if version <= self._version:
+                return
+            for key, value in changes:
+                self._store_local(key, value)
+            self._version = version
+
+    def get(self, key, default=None):
+        self.refresh()
+        return self._local.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        self.refresh()
+        return len(self._local)
+
+    def items(self):
+        self.refresh()
+        return list(self._local.items())
+
+    def set(self, key, value):
+        self.refresh()
+        self.store.backend.set(self.name, key, value)
+        self._store_local(key, value)
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def delete(self, key):
+        self.refresh()
+        self.store.backend.delete(self.name, key)
+        self._store_local(key, None)
+
+    def update(self, key, fn):
+        """Ler-modificar-gravar atômico: fn(valor atual ou None) -> novo valor
+
+        fn recebe uma cópia que pode modificar; se devolver UNCHANGED nada é
+        gravado. Retorna o valor que ficou gravado.
+        """
+        self.refresh()
+        backend = self.store.backend
+        with backend.transaction():
+            current = backend.get(self.name, key)
+            value = fn(current)
+            if value is UNCHANGED:
+                return current
+            backend.set(self.name, key, value)
+        self._store_local(key, value)
+        return value
+
+    def setdefault(self, key, value):
+        """Gravar se a chave não existir; retorna o valor que ficou gravado"""
+        return self.update(key, lambda current: value if current is None else UNCHANGED)
+
+    def _store_local(self, key, value):
+        with self._lock:
+            if value is None:
+                self._local.pop(key, None)
+            else:
+                self._local[key] = value
+            for listener in self._listeners:
+                listener(key, value)
+
+    def _apply_seed(self, backend):
+        if not self._seed:
+            return
+        for key, value in self._seed().items():
+            with backend.transaction():
+                if backend.get(self.name, key) is None:
+                    backend.set(self.name, key, value)
+
+
+class StateStore:
+    """Ponto único de acesso ao estado compartilhado dos blueprints
+
+    Os namespaces podem ser criados no import dos módulos; o backend é
+    escolhido depois por configure() (ver STATE_BACKEND em main.py).
+    """
+
+    def __init__(self):
+        self.backend = InProcessBackend()
+        self.refresh_interval = DEFAULT_REFRESH_INTERVAL
+        self._namespaces = {}
+
+    def configure(self, backend, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.backend = backend
+        self.refresh_interval = refresh_interval
+        for namespace in self._namespaces.values():
+            namespace.reset()
+
+    def namespace(self, name, seed=None):
+        """Namespace compartilhado; seed() devolve os dados iniciais {chave: valor}"""
+        if name not in self._namespaces:
+            self._namespaces[name] = SharedNamespace(self, name, seed)
+        return self._namespaces[name]
+
+    def refresh(self, force=False):
+        """Sincronizar todos os namespaces (ex.: antes de montar uma resposta em cache)"""
+        for namespace in list(self._namespaces.values()):
+            namespace.refresh(force)
+
+    def transaction(self):
+        return self.backend.transaction()
+
+    def version(self, name):
+        return self.backend.version(name)
+
+    def bump(self, name):
+        return self.backend.bump(name)
+
+
+def create_backend(config):
+    """Backend conforme STATE_BACKEND: 'memory' ou 'sqlite' (STATE_SQLITE_PATH)"""
+    if config.get('STATE_BACKEND') == 'sqlite':
+        return SqliteBackend(config['STATE_SQLITE_PATH'])
+    return InProcessBackend()
+
+
+STATE = StateStore()
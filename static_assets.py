@@ -0,0 +1,144 @@
+from flask import current_app, request
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele só há a variante gzip
+    brotli = None
+
+# Tipos que valem a pena comprimir (imagens já vêm comprimidas)
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+
+class StaticAsset:
+    """Arquivo estático carregado em memória com variantes comprimidas"""
+
+    __slots__ = ('path', 'url_path', 'content_type', 'etag', 'body', 'encodings')
+
+    def __init__(self, path, url_path, content_type, body):
+        self.path = path
+        self.url_path = url_path
+        self.content_type = content_type
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        # content-encoding -> corpo comprimido, em ordem de preferência
+        self.encodings = {}
+
+    def compress(self):
+        if not self.content_type.startswith(COMPRESSIBLE_TYPES) or len(self.body) < MIN_COMPRESS_SIZE:
+            return
+        if brotli is not None:
+            compressed = brotli.compress(self.body, quality=11)
+            if len(compressed) < len(self.body):
+                self.encodings['br'] = compressed
+        compressed = gzip.compress(self.body, compresslevel=9, mtime=0)
+        if len(compressed) < len(self.body):
+            self.encodings['gzip'] = compressed
+
+
+class StaticManifest:
+    """Manifesto dos arquivos estáticos montado na inicialização
+
+    Cada arquivo recebe uma URL com fingerprint do conteúdo
+    (css/style.<hash>.css), servida com cache imutável; a URL original
+    continua funcionando com revalidação por ETag. As páginas HTML têm suas
+    referências reescritas para as URLs com fingerprint. Depois de montado,
+    servir um arquivo não toca o sistema de arquivos.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._assets = {}
+        self._fingerprinted = {}
+        self.build()
+
+    def build(self):
+        """(Re)ler a pasta estática e montar o manifesto"""
+        assets = {}
+        fingerprinted = {}
+        pages = []
+        if self.root and os.path.isdir(self.root):
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+                for filename in filenames:
+                    if filename.startswith('.'):
+                        continue
+                    full_path = os.path.join(dirpath, filename)
+                    path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                    if content_type.startswith('text/'):
+                        content_type += '; charset=utf-8'
+                    with open(full_path, 'rb') as file:
+                        body = file.read()
+                    if path.endswith('.html'):
+                        pages.append((path, content_type, body))
+                        continue
+                    asset = StaticAsset(path, self._fingerprint(path, body), content_type, body)
+                    asset.compress()
+                    assets[path] = asset
+                    fingerprinted[asset.url_path] = asset
+
+        # Páginas HTML apontam para as URLs com fingerprint dos demais arquivos
+        for path, content_type, body in pages:
+            html = body.decode('utf-8')
+            for asset in assets.values():
+                # Mantém parâmetros como ?w=128 depois do caminho
+                html = re.sub(f'"{re.escape(asset.path)}(?=["?])', f'"{asset.url_path}', html)
+            asset = StaticAsset(path, path, content_type, html.encode('utf-8'))
+            asset.compress()
+            assets[path] = asset
+
+        self._assets = assets
+        self._fingerprinted = fingerprinted
+
+    def __len__(self):
+        return len(self._assets)
+
+    def __iter__(self):
+        return iter(list(self._assets.values()))
+
+    def url_for(self, path):
+        """URL com fingerprint do arquivo (ou o próprio caminho se não existir)"""
+        asset = self._assets.get(path)
+        return asset.url_path if asset else path
+
+    def lookup(self, path):
+        """(asset, imutável) para o caminho pedido, ou (None, False)"""
+        asset = self._fingerprinted.get(path)
+        if asset is not None:
+            return asset, True
+        return self._assets.get(path), False
+
+    def response(self, asset, immutable=False):
+        """Resposta com a melhor variante aceita pelo cliente"""
+        encoding = next(
+            (name for name in asset.encodings if name in request.accept_encodings),
+            None
+        )
+        # Cada variante comprimida é uma representação distinta, com ETag própria
+        etag = f'{asset.etag}-{encoding}' if encoding else asset.etag
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            body = asset.encodings[encoding] if encoding else asset.body
+            response = current_app.response_class(body, status=200, content_type=asset.content_type)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        if asset.encodings:
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    @staticmethod
+    def _fingerprint(path, body):
+        base, ext = os.path.splitext(path)
+        return f'{base}.{hashlib.sha256(body).hexdigest()[:12]}{ext}'
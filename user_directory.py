@@ -0,0 +1,229 @@
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+import datetime
+import json
+import threading
+import time
+
+# Perfis lidos ficam em memória por até CACHE_TTL segundos; escritas feitas
+# neste processo invalidam a entrada na hora, as de outros workers aparecem
+# quando ela expira
+DEFAULT_CACHE_SIZE = 2048
+DEFAULT_CACHE_TTL = 10.0
+
+# Colunas guardadas como lista JSON
+JSON_FIELDS = ('completed_courses', 'badges')
+PROFILE_FIELDS = ('password_hash', 'level', 'points') + JSON_FIELDS
+
+
+def normalize_email(email):
+    """Forma usada na busca: sem espaços nas pontas e case-folded"""
+    return email.strip().casefold()
+
+
+class Team(db.Model):
+    """Equipe de alunos"""
+    __tablename__ = 'teams'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+
+class UserAccount(db.Model):
+    """Aluno cadastrado, com pontuação e cursos concluídos"""
+    __tablename__ = 'user_accounts'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    email = db.Column(db.String(120), nullable=False)
+    # normalize_email(email): login e token buscam por esta coluna indexada
+    email_key = db.Column(db.String(120), nullable=False, unique=True)
+    password_hash = db.Column(db.String(255), nullable=False)
+    name = db.Column(db.String(120), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), index=True)
+    level = db.Column(db.Integer, nullable=False, default=1)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    completed_courses = db.Column(db.Text, nullable=False, default='[]')
+    badges = db.Column(db.Text, nullable=False, default='[]')
+    created_at = db.Column(db.String(32), nullable=False)
+
+    team = db.relationship(Team, lazy='joined')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'email': self.email,
+            'password_hash': self.password_hash,
+            'name': self.name,
+            'team': self.team.name if self.team else '',
+            'level': self.level,
+            'points': self.points,
+            'completed_courses': json.loads(self.completed_courses),
+            'badges': json.loads(self.badges)
+        }
+
+
+class ProfileCache:
+    """Cache LRU com expiração dos perfis lidos do banco"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, profile = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return profile
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, profile):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, profile)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class UserDirectory:
+    """Cadastro de alunos no banco, com leitura de perfis pelo ProfileCache
+
+    Os perfis são dicts no formato {'email', 'password_hash', 'name',
+    'team', 'level', 'points', 'completed_courses', 'badges'} e não devem
+    ser modificados por quem os recebe; alterações passam por update().
+    """
+
+    def __init__(self):
+        self.cache = ProfileCache()
+
+    def configure(self, cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL):
+        self.cache = ProfileCache(cache_size, cache_ttl)
+
+    def get(self, email):
+        """Perfil do aluno, ou None se o email não estiver cadastrado"""
+        key = normalize_email(email)
+        profile = self.cache.get(key)
+        if profile is None:
+            account = UserAccount.query.filter_by(email_key=key).first()
+            if account is None:
+                return None
+            profile = account.to_dict()
+            self.cache.put(key, profile)
+        return profile
+
+    def __contains__(self, email):
+        return self.get(email) is not None
+
+    def add(self, email, password_hash, name, team='', create_team=False, **profile):
+        """Cadastrar aluno; retorna o perfil, ou None se o email já existir
+
+        A equipe precisa existir (ValueError se não existir), a menos que
+        create_team seja True (dados de demonstração e administração).
+        """
+        key = normalize_email(email)
+        # Uma nova tentativa se outro pedido criou a mesma equipe ao mesmo tempo
+        for _ in range(2):
+            account = UserAccount(
+                email=email.strip(),
+                email_key=key,
+                password_hash=password_hash,
+                name=name,
+                team=self._team(team, create_team),
+                created_at=datetime.datetime.now().isoformat(),
+                **self._columns(profile)
+            )
+            db.session.add(account)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                if UserAccount.query.filter_by(email_key=key).first() is not None:
+                    return None
+                continue
+            self.cache.discard(key)
+            return account.to_dict()
+        return None
+
+    def update(self, email, **profile):
+        """Alterar campos do perfil (PROFILE_FIELDS); retorna o perfil atualizado ou None"""
+        key = normalize_email(email)
+        updated = UserAccount.query.filter_by(email_key=key).update(
+            self._columns(profile), synchronize_session=False
+        )
+        db.session.commit()
+        self.cache.discard(key)
+        return self.get(email) if updated else None
+
+    @staticmethod
+    def team_exists(name):
+        return db.session.query(Team.id).filter_by(name=name).first() is not None
+
+    def add_teams(self, names):
+        """Cadastrar as equipes que ainda não existem"""
+        for name in names:
+            if not self.team_exists(name):
+                db.session.add(Team(name=name))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # outro worker cadastrou as mesmas equipes
+
+    @staticmethod
+    def team_emails(team):
+        """Consulta (subquery) dos emails dos alunos da equipe"""
+        return select(UserAccount.email_key).join(Team).where(Team.name == team)
+
+    def seed(self, users):
+        """Cadastrar alunos de demonstração se ainda não houver nenhum"""
+        if db.session.query(UserAccount.id).first() is not None:
+            return
+        for email, user in users.items():
+            self.add(email, create_team=True, **user)
+
+    @staticmethod
+    def _columns(profile):
+        unknown = set(profile) - set(PROFILE_FIELDS)
+        if unknown:
+            raise TypeError(f"Campos de perfil desconhecidos: {', '.join(sorted(unknown))}")
+        return {
+            field: json.dumps(value) if field in JSON_FIELDS else value
+            for field, value in profile.items()
+        }
+
+    @staticmethod
+    def _team(name, create=False):
+        if not name:
+            return None
+        team = Team.query.filter_by(name=name).first()
+        if team is None:
+            if not create:
+                raise ValueError(f'Equipe {name!r} não cadastrada')
+            team = Team(name=name)
+        return team
+
+
+USER_DIRECTORY = UserDirectory()